@@ -6,6 +6,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 from utils.config import load_config, validate_config
 from utils.logger import setup_logger
+from utils.playwright_patch import apply_playwright_patch
 from bots.send_execute_query_bot import SendQueryBot
 from bots.send_download_query_bot import SendDownloadQueryBot
 from bots.manage_suspended_queries_bot import ManageSuspendedQueriesBot
@@ -20,6 +21,12 @@ def main():
         # 1. Load configuration
         config = load_config()
         validate_config(config)
+        # Immutable (iso3, name) pairs shared by every bot, worker thread and retry
+        config['_iso3_items'] = tuple(config['iso3_to_country'].items())
+
+        # Skip Playwright's per-call stack capture in headless runs (override with PW_INSPECT_STACK)
+        if apply_playwright_patch(default=config.get('automation', {}).get('headless', False)):
+            logger.info("Playwright stack capture disabled.")
         
         # 2. Run Bot
         if config['workflow']['execute_send_query']:
@@ -1,24 +1,135 @@
+import json
+import os
+from urllib.parse import urlsplit
 from playwright.sync_api import sync_playwright
+from utils.json_io import write_json_atomic
+
+# Removes Qualtrics (QSI) survey overlays on every page load and whenever they are injected later
+_REMOVE_QSI_INIT_SCRIPT = """
+new MutationObserver(() => {
+    document.querySelectorAll('div[class*="QSI"], div[id*="QSI"]').forEach(el => el.remove());
+}).observe(document.documentElement || document, {subtree: true, childList: true});
+"""
+
+def load_storage_state(path):
+    """Returns the storage_state saved at `path`, or None when it is missing or unreadable."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def session_file_for(path, key):
+    """Derives a per-`key` storage_state path, e.g. output/session_state.json -> output/session_state.Auto2010.json."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{key}{ext}"
 
 class BrowserManager:
-    def __init__(self, headless=False):
+    def __init__(self, headless=False, cdp_endpoint=None, blocked_resource_types=None, blocked_hosts=None):
         self.playwright = None
         self.browser = None
         self.context = None
         self.page = None
+        self._owns_context = False
         self.headless = headless
+        # e.g. "http://localhost:9222" for a Chromium started with --remote-debugging-port=9222
+        self.cdp_endpoint = cdp_endpoint
+        # Requests aborted before they hit the network, e.g. resource types {"image", "font"} and analytics hosts
+        self.blocked_resource_types = frozenset(blocked_resource_types or ())
+        self.blocked_hosts = tuple(blocked_hosts or ())
+
+    def start(self, storage_state=None):
+        """
+        Starts the browser and creates a new context/page.
+        `storage_state` (from BrowserContext.storage_state()) restores cookies, e.g. a logged-in session.
+        """
+        self.start_browser()
+        return self.new_context(storage_state)
 
-    def start(self):
-        """Starts the browser and creates a new context/page."""
+    def start_browser(self):
+        """Launches (or attaches to) the browser, unless it is already running and connected."""
+        if self.browser and self.browser.is_connected():
+            return self.browser
+        self.stop()
         self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(headless=self.headless)
-        self.context = self.browser.new_context()
+        if self.cdp_endpoint:
+            # Attach to an already running Chromium instead of paying a cold launch per session
+            self.browser = self.playwright.chromium.connect_over_cdp(self.cdp_endpoint)
+        else:
+            self.browser = self.playwright.chromium.launch(headless=self.headless)
+        return self.browser
+
+    def new_context(self, storage_state=None):
+        """
+        Replaces the context/page with a fresh one while keeping the browser process running
+        (a new context costs milliseconds, a browser launch seconds). Starts the browser if needed.
+        """
+        self.start_browser()
+        self.close_context()
+        return self._open_context(storage_state)
+
+    def _open_context(self, storage_state=None):
+        """Creates the context (reusing the attached browser's default one when possible) and its page."""
+        if self.cdp_endpoint and self.browser.contexts and storage_state is None:
+            self.context = self.browser.contexts[0]
+            self._owns_context = False
+        else:
+            self.context = self.browser.new_context(storage_state=storage_state)
+            self._owns_context = True
+        self.context.add_init_script(_REMOVE_QSI_INIT_SCRIPT)
+        if self.blocked_resource_types or self.blocked_hosts:
+            self.context.route('**/*', self._route_blocked)
         self.page = self.context.new_page()
         return self.page
 
+    def _route_blocked(self, route):
+        """Aborts requests for blocked resource types or hosts (and their subdomains); lets the rest through."""
+        request = route.request
+        if request.resource_type in self.blocked_resource_types:
+            return route.abort()
+        if self.blocked_hosts:
+            host = urlsplit(request.url).hostname or ''
+            if any(host == h or host.endswith('.' + h) for h in self.blocked_hosts):
+                return route.abort()
+        return route.continue_()
+
+    def save_storage_state(self, path):
+        """
+        Writes the current context's cookies/localStorage to `path` and returns them.
+        The file is replaced atomically, so parallel workers never read a half-written one.
+        """
+        state = self.context.storage_state()
+        write_json_atomic(path, state)
+        return state
+
+    def close_context(self):
+        """Closes our page, and the context too when we created it."""
+        try:
+            if self._owns_context and self.context:
+                self.context.close()
+            else:
+                if self.context and (self.blocked_resource_types or self.blocked_hosts):
+                    # Leave the attached browser's own context as we found it
+                    self.context.unroute('**/*', self._route_blocked)
+                if self.page and not self.page.is_closed():
+                    self.page.close()
+        except Exception:
+            pass
+        self.context = None
+        self.page = None
+
     def stop(self):
         """Stops the browser and playwright."""
+        if self.cdp_endpoint:
+            # Only close our tab/context; the external browser keeps running for the next session
+            self.close_context()
         if self.browser:
             self.browser.close()
         if self.playwright:
             self.playwright.stop()
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.page = None
@@ -27,7 +27,7 @@ def login(page, email, password, login_url, logger):
             
             # explicit check for error message
             error_msg = page.locator('span[id*="lblError"], div[class*="error"]')
-            if error_msg.count() > 0 and error_msg.first.is_visible():
+            if error_msg.first.is_visible():
                 text = error_msg.first.text_content().strip()
                 if text:
                     logger.error(f"[LOGIN] Failed with error message: {text}")
@@ -49,3 +49,15 @@ def login(page, email, password, login_url, logger):
             
     logger.error("[LOGIN] All login attempts failed.")
     return False
+
+def is_logged_in(page, url, logger):
+    """Checks whether the page's context already holds a valid session (e.g. restored storage_state)."""
+    try:
+        page.goto(url, timeout=60000)
+        ensure_popup_closed(page, logger)
+        page.wait_for_selector('text=Logout', timeout=10000)
+        logger.info("[LOGIN] Existing session is still valid.")
+        return True
+    except Exception:
+        logger.info("[LOGIN] No valid session found.")
+        return False
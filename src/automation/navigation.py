@@ -1,30 +1,212 @@
 import logging
+import weakref
+from playwright.sync_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+# Resolves as soon as one of the named selectors ([[name, sel], ...], checked in order) is visible
+# in the document or any same-origin iframe, with {name, frame} where frame is null for the main
+# document or the iframe's {name, url}; resolves null on timeout. MutationObservers are attached to
+# every reachable document (re-scanned on iframe loads), so the check runs on DOM changes instead
+# of on a fixed polling interval.
+_WAIT_IN_FRAMES_JS = """([entries, timeout]) => new Promise(resolve => {
+    const observed = new Set();
+    const docs = () => {
+        const result = [{doc: document, frame: null}];
+        document.querySelectorAll('iframe').forEach(f => {
+            try {
+                if (f.contentDocument) {
+                    result.push({doc: f.contentDocument, frame: {name: f.name, url: f.contentWindow.location.href}});
+                }
+            } catch (e) {}
+        });
+        return result;
+    };
+    const find = () => {
+        const all = docs();
+        for (const [name, sel] of entries) {
+            for (const d of all) {
+                if (Array.from(d.doc.querySelectorAll(sel)).some(el => el.offsetParent !== null)) {
+                    return {name: name, frame: d.frame};
+                }
+            }
+        }
+        return null;
+    };
+    let timer = null;
+    const mo = new MutationObserver(() => onChange());
+    const observeAll = () => docs().forEach(d => {
+        if (observed.has(d.doc)) return;
+        observed.add(d.doc);
+        mo.observe(d.doc, {subtree: true, childList: true, attributes: true});
+    });
+    const done = result => {
+        mo.disconnect();
+        document.removeEventListener('load', onChange, true);
+        clearTimeout(timer);
+        resolve(result);
+    };
+    const onChange = () => {
+        observeAll();
+        const hit = find();
+        if (hit) done(hit);
+    };
+    const hit = find();
+    if (hit) return resolve(hit);
+    observeAll();
+    document.addEventListener('load', onChange, true);
+    timer = setTimeout(() => done(null), timeout);
+})"""
+
+# True once the results grid pager shows the expected current page (the pager renders it as a
+# <span>, every other page as a link), or, with no expected page, any page other than `previous`.
+_GRID_PAGE_READY_JS = """([gridId, expected, previous]) => {
+    if (!document.getElementById(gridId)) return false;
+    const footer = document.querySelector('tr.grid-footer');
+    const current = footer ? footer.querySelector('td span') : null;
+    if (!current) return false;
+    const text = current.innerText.trim();
+    return expected !== null ? text === expected : text !== previous;
+}"""
+
+# Current page number shown by the results grid pager, or null when the grid or pager is missing
+_CURRENT_GRID_PAGE_JS = """(gridId) => {
+    if (!document.getElementById(gridId)) return null;
+    const footer = document.querySelector('tr.grid-footer');
+    const current = footer ? footer.querySelector('td span') : null;
+    return current ? current.innerText.trim() : null;
+}"""
+
+# Reads the results grid pager in one round-trip: the page numbers shown, the current page and the
+# route towards `target` ('current', 'target' link visible, '...' link 'next'/'previous', 'end' or
+# 'none'). Returns null until the pager shows page numbers, so it doubles as a wait_for_function
+# predicate; it never clicks, so re-running it after a postback is safe.
+_PAGER_STATE_JS = """([gridId, target]) => {
+    let row = document.querySelector('tr.grid-footer');
+    if (!row) {
+       const rows = Array.from(document.querySelectorAll('#' + gridId + ' tr'));
+       row = rows.find(r => {
+           const links = r.querySelectorAll('a');
+           return links.length >= 2 && (r.innerText.includes('...') || 
+                  Array.from(links).some(a => !isNaN(a.innerText.trim()) && a.innerText.trim() !== ''));
+       });
+    }
+    if (!row) return null;
+    const pages = Array.from(row.querySelectorAll('td span, td a'))
+        .map(l => l.innerText.trim()).filter(t => !isNaN(t) && t !== '');
+    if (!pages.length) return null;
+
+    const footer = document.querySelector('tr.grid-footer');
+    const currentEl = footer ? footer.querySelector('td span') : null;
+    const state = {pages: pages, current: currentEl ? currentEl.innerText.trim() : null, direction: null};
+    if (state.current === String(target)) return Object.assign(state, {route: 'current'});
+
+    const grid = document.getElementById(gridId);
+    if (grid && Array.from(grid.querySelectorAll('a')).some(a => a.innerText.trim() === String(target))) {
+        return Object.assign(state, {route: 'target'});
+    }
+
+    if (!Array.from(row.querySelectorAll('a')).some(a => a.innerText.includes('...'))) {
+        return Object.assign(state, {route: 'none'});
+    }
+    if (target > Math.max(...pages.map(Number))) {
+        // "Next" ellipsis: the footer's last anchor is '...'
+        const footerLinks = footer ? Array.from(footer.querySelectorAll('a')) : [];
+        if (!footerLinks.length || !footerLinks[footerLinks.length - 1].innerText.includes('...')) {
+            return Object.assign(state, {route: 'end'});
+        }
+        state.direction = 'next';
+    } else {
+        state.direction = 'previous';
+    }
+    state.canPostBack = typeof __doPostBack === 'function';
+    return Object.assign(state, {route: 'ellipsis'});
+}"""
+
+# Posts 'Page$N' straight to the grid. Deferred so the evaluate returns before the form submit
+# tears down the document, i.e. it is sent exactly once and never reported as a failure.
+_GRID_POSTBACK_JS = "([eventTarget, arg]) => { setTimeout(() => __doPostBack(eventTarget, arg), 0); }"
+
+
+# Frame -> ('No, thanks.' locator, same locator including hidden matches), reused across
+# ensure_popup_closed calls; weak keys so detached frames drop out on their own
+_popup_locators = weakref.WeakKeyDictionary()
+
+def _popup_locator(frame, include_hidden=False):
+    """Returns the cached feedback-modal button locator for a frame."""
+    locs = _popup_locators.get(frame)
+    if locs is None:
+        locs = _popup_locators[frame] = (
+            frame.get_by_role("button", name="No, thanks."),
+            frame.get_by_role("button", name="No, thanks.", include_hidden=True),
+        )
+    return locs[1] if include_hidden else locs[0]
+
+# Reports the feedback modal to Python as soon as it is inserted into any document of the context
+_POPUP_WATCH_JS = """
+new MutationObserver((mutations, observer) => {
+    for (const m of mutations) {
+        for (const n of m.addedNodes) {
+            if (n.nodeType === 1 && (n.textContent || '').includes('No, thanks.')) {
+                window._notifyPopup();
+                return;
+            }
+        }
+    }
+}).observe(document, {subtree: true, childList: true});
+"""
+
+# context -> True once the modal has been reported and not yet dismissed (or gone);
+# entries are dropped when the context closes
+_popup_seen = weakref.WeakKeyDictionary()
+
+def _watch_popup(context):
+    """Installs the popup watcher once per browser context."""
+    if context in _popup_seen:
+        return
+    context_ref = weakref.ref(context)
+    context.expose_binding('_notifyPopup', lambda source: _popup_seen.__setitem__(context_ref(), True))
+    context.add_init_script(_POPUP_WATCH_JS)
+    context.on('close', lambda _: _popup_seen.pop(context_ref(), None))
+    _popup_seen[context] = False
 
 def ensure_popup_closed(page, logger):
     """
     Manually checks and closes the popup if visible. 
     Useful to call before critical actions.
     Checks main page and all frames.
+    Once setup_auto_close_popup has installed the watcher, this is a flag
+    check until the modal is actually reported. The flag is cleared only once
+    the modal is dismissed or no longer in any frame, so one reported before it
+    becomes visible is checked again on the next call.
     """
+    watched = page.context in _popup_seen
+    if watched and not _popup_seen[page.context]:
+        return
+
     try:
-        # 1. Check Main Page
-        no_thanks = page.get_by_role("button", name="No, thanks.")
-        if no_thanks.is_visible():
-            logger.info("Feedback modal detected (Manual Check)! Clicking 'No, thanks.'...")
-            no_thanks.click()
-            page.wait_for_timeout(100)
-            return
-
-        # 2. Check Frames (if popup might be inside one)
-        for frame in page.frames:
+        frames = [page.main_frame] + [f for f in page.frames if f != page.main_frame]
+        present = False
+        for frame in frames:
             try:
-                btn = frame.get_by_role("button", name="No, thanks.")
+                btn = _popup_locator(frame)
                 if btn.is_visible():
-                    logger.info(f"Feedback modal detected in frame '{frame.name or frame.url}'! Clicking...")
+                    if frame == page.main_frame:
+                        logger.info("Feedback modal detected (Manual Check)! Clicking 'No, thanks.'...")
+                    else:
+                        logger.info(f"Feedback modal detected in frame '{frame.name or frame.url}'! Clicking...")
                     btn.click()
                     page.wait_for_timeout(100)
+                    if watched:
+                        _popup_seen[page.context] = False
                     return
-            except: pass
+                if watched and not present:
+                    present = _popup_locator(frame, include_hidden=True).count() > 0
+            except PlaywrightError:
+                # Frame detached or navigating
+                pass
+
+        if watched and not present:
+            # Dismissed elsewhere (e.g. the locator handler) or removed
+            _popup_seen[page.context] = False
     except Exception:
         pass
 
@@ -49,6 +231,11 @@ def setup_auto_close_popup(page, logger):
     except Exception as e:
         logger.warning(f"Failed to register auto-popup handler (might not be supported on this page context): {e}")
 
+    try:
+        _watch_popup(page.context)
+    except Exception as e:
+        logger.warning(f"Failed to install popup watcher, falling back to manual checks: {e}")
+
 def navigate_to_trade_data(page, logger):
     """Navigates to Advanced Query > Trade Data via the top menu."""
     logger.info("Navigating to Advanced Query > Trade Data...")
@@ -59,7 +246,7 @@ def navigate_to_trade_data(page, logger):
     # Reduce timeout to fail fast if overlay/element is stuck (default is 30s)
     try:
         advanced_query_menu.hover(timeout=5000) 
-    except:
+    except PlaywrightError:
         logger.info("Hover timed out. Attempting forceful click on submenu directly...")
     
     # advanced_query_menu.hover() - hover usually doesn't trigger network, keeping small wait for UI stability
@@ -101,6 +288,34 @@ def navigate_to_download_and_view_results(page, logger):
         logger.error(f"Navigation failed: {e}")
         return False
 
+def return_to_reporter_step(page, logger, timeout=2000):
+    """
+    Checks whether the page is still on the query-edit screen after a submit, with the Reporter
+    'Modify' link available. True means the next country can skip navigation and query selection.
+    """
+    try:
+        ensure_popup_closed(page, logger)
+        page.locator('#divRptrmodify a').wait_for(state='visible', timeout=timeout)
+        return True
+    except PlaywrightError:
+        logger.info("Query-edit screen not available; navigating from the menu.")
+        return False
+
+def click_and_wait_for_postback(page, target, logger, timeout=30000):
+    """
+    Clicks an ASP.NET postback button and waits for the page's own POST response, instead of
+    networkidle (which background analytics can keep from settling).
+    """
+    page_url = page.url.split('?')[0]
+    try:
+        with page.expect_response(
+            lambda r: r.request.method == 'POST' and r.url.split('?')[0] == page_url, timeout=timeout
+        ):
+            target.click()
+    except PlaywrightTimeoutError:
+        logger.warning(f"No postback response within {timeout // 1000}s after click; continuing.")
+    page.wait_for_load_state('domcontentloaded')
+
 def select_existing_query(page, query_name, logger):
     """Selects an existing query from the dropdown and clicks Proceed."""
     ensure_popup_closed(page, logger)
@@ -126,14 +341,16 @@ def select_existing_query(page, query_name, logger):
         ensure_popup_closed(page, logger)
         proceed_btn = page.locator('#MainContent_btnProceed')
         proceed_btn.wait_for(state='visible', timeout=5000)
-        proceed_btn.click()
-        
-        page.wait_for_load_state('networkidle')
+        click_and_wait_for_postback(page, proceed_btn, logger)
         return True
     return False
 
 def click_final_submit(page, logger):
-    """Clicks the final Submit button, handling potential Telerik overlays."""
+    """
+    Clicks the final Submit button, handling potential Telerik overlays.
+    Returns once the submit postback has been answered and the resulting page has loaded,
+    so callers need no extra settle delay before the next query.
+    """
     ensure_popup_closed(page, logger)
     
     # Force remove stuck Telerik overlays via JS to ensure the button is clickable.
@@ -144,7 +361,119 @@ def click_final_submit(page, logger):
     submit_btn = page.locator('#MainContent_btnSaveExecute')
     if submit_btn.is_visible():
         ensure_popup_closed(page, logger)
-        submit_btn.click()
-        page.wait_for_load_state('networkidle')
+        click_and_wait_for_postback(page, submit_btn, logger)
+        page.wait_for_load_state('load')
         return True
-    return False
\ No newline at end of file
+    return False
+
+def wait_for_selector_in_any_frame(page, selector, timeout=5000):
+    """
+    Waits until `selector` is visible in the page or any of its frames.
+    Returns the Frame holding the element, or None on timeout.
+    """
+    _, frame = wait_for_any_selector_in_any_frame(page, {selector: selector}, timeout)
+    return frame
+
+def _match_frame(page, info):
+    """Maps a {name, url} iframe descriptor from _WAIT_IN_FRAMES_JS (None = main document) to its Frame."""
+    if not info:
+        return page.main_frame
+    for frame in page.frames:
+        if frame == page.main_frame or frame.is_detached():
+            continue
+        if (info['name'] and frame.name == info['name']) or frame.url == info['url']:
+            return frame
+    return None
+
+def wait_for_any_selector_in_any_frame(page, selectors, timeout=5000):
+    """
+    Waits until any of the named `selectors` ({name: selector}) is visible in the page or its frames.
+    Returns (name, frame) for the first match in dict order, or (None, None) on timeout.
+    """
+    try:
+        # One in-page search across all same-origin frames reports both the selector and the frame
+        hit = page.evaluate(_WAIT_IN_FRAMES_JS, [list(selectors.items()), timeout])
+        if hit:
+            frame = _match_frame(page, hit['frame'])
+            if frame:
+                return hit['name'], frame
+    except Exception:
+        # Cross-origin frames or navigation mid-wait; fall through to the direct frame scan
+        pass
+
+    for name, selector in selectors.items():
+        for frame in page.frames:
+            if frame.is_detached():
+                continue
+            try:
+                if frame.locator(selector).first.is_visible():
+                    return name, frame
+            except Exception:
+                pass
+    return None, None
+
+def pager_step(page, grid_id, page_index, postback_target=None, timeout=15000):
+    """
+    Waits for the results grid pager and moves it one step towards `page_index`.
+    Returns {'action', 'pages', 'current', 'direction'} or None when no pager renders in time.
+    'action' is 'current' (already there), 'clicked_target', 'jumped' (direct 'Page$N' postback to
+    `postback_target`, the grid's UniqueID; only when given), 'clicked_ellipsis', 'end' (no next
+    '...' link) or 'none' (no route). Only the pager read is retried; the click is sent once.
+    """
+    state = None
+    for _ in range(3):
+        try:
+            state = page.wait_for_function(_PAGER_STATE_JS, arg=[grid_id, page_index], timeout=timeout).json_value()
+            break
+        except PlaywrightTimeoutError:
+            return None
+        except PlaywrightError:
+            # A full postback destroyed the execution context; re-check on the new document
+            page.wait_for_load_state('domcontentloaded')
+    if state is None:
+        return None
+
+    route = state.pop('route')
+    can_post_back = state.pop('canPostBack', False)
+    if route in ('current', 'end', 'none'):
+        state['action'] = route
+        return state
+
+    grid = page.locator(f'#{grid_id}')
+    if route == 'target':
+        grid.get_by_role('link', name=str(page_index), exact=True).first.click()
+        state['action'] = 'clicked_target'
+    elif postback_target and can_post_back:
+        # Far page: one postback instead of walking the '...' groups one at a time
+        page.evaluate(_GRID_POSTBACK_JS, [postback_target, f'Page${page_index}'])
+        state['action'] = 'jumped'
+    else:
+        ellipses = grid.locator('a').filter(has_text='...')
+        (ellipses.last if state['direction'] == 'next' else ellipses.first).click()
+        state['action'] = 'clicked_ellipsis'
+    return state
+
+def current_grid_page(page, grid_id):
+    """Returns the page number the results grid pager currently shows, or None if it cannot be read."""
+    try:
+        current = page.evaluate(_CURRENT_GRID_PAGE_JS, grid_id)
+    except PlaywrightError:
+        return None
+    return int(current) if current and current.isdigit() else None
+
+def wait_for_grid_page(page, grid_id, expected=None, previous=None, timeout=15000):
+    """
+    Waits until a pager postback has rendered: the current page equals `expected`, or
+    (with no expected page) differs from `previous`. Returns False on timeout.
+    """
+    arg = [grid_id, None if expected is None else str(expected), previous]
+    for _ in range(3):
+        try:
+            page.wait_for_function(_GRID_PAGE_READY_JS, arg=arg, timeout=timeout)
+            return True
+        except PlaywrightTimeoutError:
+            return False
+        except PlaywrightError:
+            # A full postback destroyed the execution context; re-check on the new document
+            page.wait_for_load_state('domcontentloaded')
+    return False
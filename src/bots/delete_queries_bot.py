@@ -8,7 +8,14 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from utils.logger import setup_logger
 from automation.browser import BrowserManager
 from automation.login import login
-from automation.navigation import setup_auto_close_popup, navigate_to_download_and_view_results, ensure_popup_closed
+from automation.navigation import (
+    setup_auto_close_popup,
+    navigate_to_download_and_view_results,
+    ensure_popup_closed,
+    pager_step,
+    wait_for_grid_page
+)
+from playwright.sync_api import Error as PlaywrightError
 
 class DeleteQueriesBot:
     def __init__(self, config):
@@ -19,7 +26,10 @@ class DeleteQueriesBot:
         log_file = os.path.join(log_dir, f"delete_queries_{int(time.time())}.log")
         
         self.logger = setup_logger(self.__class__.__name__, log_file=log_file)
-        self.browser_manager = BrowserManager(headless=self.config.get('headless', False))
+        self.browser_manager = BrowserManager(
+            headless=self.config.get('headless', False),
+            cdp_endpoint=self.config.get('automation', {}).get('cdp_endpoint')
+        )
 
     def run(self):
         self.logger.info("Starting DeleteQueriesBot execution...")
@@ -67,7 +77,6 @@ class DeleteQueriesBot:
         if not success:
             self.logger.warning(f"[PAGE] Normal pagination failed for Page {page_index}. Attempting hard refresh...")
             # Perform a full reload of the results page to clear any corrupted viewstate/ajax issues
-            from automation.navigation import navigate_to_download_and_view_results
             if navigate_to_download_and_view_results(page, self.logger):
                 self.logger.info(f"[PAGE] Hard refresh successful. Retrying navigation to Page {page_index} from Page 1...")
                 # Try logic again from a fresh Page 1 state
@@ -79,103 +88,49 @@ class DeleteQueriesBot:
         """Internal logic for navigating the pager grid."""
         try:
             grid_id = "MainContent_QueryViewControl1_grdvQueryList"
+            grid_unique_id = "ctl00$MainContent$QueryViewControl1$grdvQueryList"
             # Use a loop to handle cases where the page might be multiple '...' sets away
             max_attempts = 15
+            allow_jump = True
             for attempt in range(max_attempts):
-                page.wait_for_timeout(1000) # Small extra wait for stability
-                
-                # Check current visible pages
-                pager_elements_info = page.evaluate(f"""
-                    () => {{
-                        let row = document.querySelector('tr.grid-footer');
-                        if (!row) {{
-                           const rows = Array.from(document.querySelectorAll('#{grid_id} tr'));
-                           row = rows.find(r => {{
-                               const links = r.querySelectorAll('a');
-                               return links.length >= 2 && (r.innerText.includes('...') || 
-                                      Array.from(links).some(a => !isNaN(a.innerText.trim()) && a.innerText.trim() !== ''));
-                           }});
-                        }}
-                        if (!row) return {{ pages: [], has_ellipsis: false }};
-                        const links = Array.from(row.querySelectorAll('td span, td a'));
-                        return {{
-                            pages: links.map(l => l.innerText.trim()).filter(t => !isNaN(t) && t !== ''),
-                            has_ellipsis: Array.from(row.querySelectorAll('a')).some(a => a.innerText.includes('...'))
-                        }};
-                    }}
-                """)
-                
-                visible_pages = [int(p) for p in pager_elements_info.get('pages', [])]
-                has_ellipsis = pager_elements_info.get('has_ellipsis', False)
-                
-                if not visible_pages:
-                    self.logger.info(f"[DEBUG] No visible pages found on attempt {attempt+1}. Waiting...")
-                    page.wait_for_timeout(2000)
-                    continue
+                # Read the pager, then click once towards the target
+                step = pager_step(page, grid_id, page_index, postback_target=grid_unique_id if allow_jump else None)
+                if not step:
+                    self.logger.info(f"[PAGE] No pager pages rendered within 15s (attempt {attempt+1}).")
+                    return False
 
-                if page_index in visible_pages:
-                    self.logger.info(f"[PAGE] Target Page {page_index} visible. Clicking...")
-                    page.evaluate(f"""
-                        () => {{
-                            const grid = document.getElementById('{grid_id}');
-                            const links = Array.from(grid.querySelectorAll('a'));
-                            const link = links.find(a => a.innerText.trim() === '{page_index}');
-                            if (link) link.click();
-                        }}
-                    """)
-                    page.wait_for_load_state('networkidle')
-                    page.wait_for_timeout(2000)
+                visible_pages = {int(p) for p in step['pages']}
+                action = step['action']
+
+                if action == 'current':
                     return True
-                
-                # If target is not in visible pages, use ellipsis if available
-                if has_ellipsis:
-                    highest_visible = max(visible_pages)
-                    
-                    if page_index > highest_visible:
-                        
-                        # Stop at end of list check
-                        can_go_forward = page.evaluate(f"""
-                            () => {{
-                                const row = document.querySelector('tr.grid-footer');
-                                if (!row) return false;
-                                const links = Array.from(row.querySelectorAll('a'));
-                                if (links.length === 0) return false;
-                                const lastLink = links[links.length - 1];
-                                return lastLink.innerText.includes('...');
-                            }}
-                        """)
-                        
-                        if not can_go_forward:
-                             self.logger.info(f"[PAGE] Page {page_index} requested, but max visible is {highest_visible} and no '...' Next button found. End of list.")
-                             return False
 
-                        idx = -1 # Last ellipsis
-                        direction = "next"
-                    else:
-                        idx = 0 # First ellipsis
-                        direction = "previous"
+                if action == 'clicked_target':
+                    self.logger.info(f"[PAGE] Target Page {page_index} visible. Clicked.")
+                    if not wait_for_grid_page(page, grid_id, expected=page_index):
+                        self.logger.warning(f"[PAGE] Pager did not confirm Page {page_index} within 15s.")
+                    return True
 
-                    self.logger.info(f"[PAGE] Page {page_index} not visible in {visible_pages}. Clicking {direction} '...' to load more pages.")
-                    page.evaluate(f"""
-                        (index) => {{
-                            const row = document.querySelector('tr.grid-footer');
-                            const ellipses = Array.from(row.querySelectorAll('a')).filter(a => a.innerText.includes('...'));
-                            if (ellipses.length > 0) {{
-                                const target = index === -1 ? ellipses[ellipses.length - 1] : ellipses[0];
-                                target.click();
-                            }}
-                        }}
-                    """, idx)
-                    page.wait_for_load_state('networkidle')
-                    page.wait_for_timeout(3000)
-                else:
-                    if page_index > max(visible_pages):
-                         self.logger.info(f"[PAGE] Page {page_index} not found and no ellipsis. End of list.")
-                         return False
+                if action == 'jumped':
+                    self.logger.info(f"[PAGE] Page {page_index} not visible in {visible_pages}. Posted back to it directly.")
+                    if wait_for_grid_page(page, grid_id, expected=page_index, timeout=10000):
+                        return True
+                    # Postback did not land on the page (e.g. past the end): walk the '...' groups instead
+                    self.logger.info(f"[PAGE] Direct postback to Page {page_index} not confirmed. Falling back to '...' navigation.")
+                    allow_jump = False
+                    continue
 
-                    if attempt > 5:
-                        break
-                    page.wait_for_timeout(2000)
+                if action == 'clicked_ellipsis':
+                    self.logger.info(f"[PAGE] Page {page_index} not visible in {visible_pages}. Clicked {step['direction']} '...' to load more pages.")
+                    wait_for_grid_page(page, grid_id, previous=step['current'])
+                    continue
+
+                if action == 'end':
+                    self.logger.info(f"[PAGE] Page {page_index} requested, but max visible is {max(visible_pages)} and no '...' Next button found. End of list.")
+                else:
+                    # The pager has rendered and holds no route to the page: end of list
+                    self.logger.info(f"[PAGE] Page {page_index} not found and no ellipsis. End of list.")
+                return False
             
             return False
         except Exception as e:
@@ -243,8 +198,8 @@ class DeleteQueriesBot:
                     row = btn.locator('xpath=./../..') # input -> td -> tr
                     q_id = "Unknown"
                     try:
-                        q_id = row.locator('td').nth(0).inner_text().strip()
-                    except: pass
+                        q_id = row.locator('td').nth(0).inner_text(timeout=2000).strip()
+                    except PlaywrightError: pass
                     
                     self.logger.info(f"   [ACTION] Deleting query ID: {q_id}...")
                     btn.click() # This triggers the dialog, handled by page.on('dialog')
@@ -1,6 +1,8 @@
 import time
 import sys
 import os
+import re
+from dataclasses import dataclass, asdict
 
 # Add src to python path for imports to work if running directly
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
@@ -8,7 +10,43 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from utils.logger import setup_logger
 from automation.browser import BrowserManager
 from automation.login import login
-from automation.navigation import setup_auto_close_popup, navigate_to_download_and_view_results, ensure_popup_closed
+from automation.navigation import (
+    setup_auto_close_popup,
+    navigate_to_download_and_view_results,
+    ensure_popup_closed,
+    pager_step,
+    wait_for_grid_page
+)
+from playwright.sync_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+# Keyword detection and extraction of the "Markets (...):" section in a single scan
+_MARKETS_RE = re.compile(r"Markets[^:]*?:(?P<body>.+?)(?:Partners|Years|Trade Type|\Z)", re.IGNORECASE | re.DOTALL)
+
+# Installed once per page via add_init_script and invoked as window.__forceCloseModal()
+_FORCE_CLOSE_JS = """() => {
+    // Try Telerik API
+    try {
+        var wnd = $find("ctl00_MainContent_QueryViewControl1_rdwndJobReport");
+        if(wnd) wnd.close();
+    } catch(e) {}
+
+    // Try DOM removal
+    document.querySelectorAll('div[id*="rdwndJobReport"]').forEach(el => el.style.display = 'none');
+    document.querySelectorAll('iframe[name="rdwndJobReport"]').forEach(el => el.remove());
+    try { $('.RadWindow').hide(); } catch(e) {} // If jQuery present
+}"""
+
+@dataclass
+class SuspendedRecord:
+    """A single suspended query row as written to the JSON/CSV outputs."""
+    __slots__ = ('query_id', 'query_name', 'reporting_country', 'years', 'trade_flows', 'timestamp', 'date')
+    query_id: str
+    query_name: str
+    reporting_country: str
+    years: str
+    trade_flows: str
+    timestamp: float
+    date: str
 
 class ManageSuspendedQueriesBot:
     def __init__(self, config):
@@ -19,8 +57,13 @@ class ManageSuspendedQueriesBot:
         log_file = os.path.join(log_dir, "suspended_queries.log")
         
         self.logger = setup_logger(self.__class__.__name__, log_file=log_file)
-        self.browser_manager = BrowserManager(headless=self.config.get('headless', False))
+        self.browser_manager = BrowserManager(
+            headless=self.config.get('headless', False),
+            cdp_endpoint=self.config.get('automation', {}).get('cdp_endpoint')
+        )
         self.last_alert = None
+        self._csv_fp = None
+        self._csv_writer = None
         
         # Optimize: Pre-load processed IDs to avoid re-work
         self.processed_ids = self._load_processed_ids()
@@ -48,6 +91,7 @@ class ManageSuspendedQueriesBot:
             try:
                 # 1. Register Modal Handler
                 setup_auto_close_popup(page, self.logger)
+                page.add_init_script("window.__forceCloseModal = " + _FORCE_CLOSE_JS)
 
                 # 2. Login
                 creds = self.config['credentials']
@@ -88,6 +132,25 @@ class ManageSuspendedQueriesBot:
                      self.browser_manager.stop()
     
         self.browser_manager.stop()
+        self.close()
+
+    def close(self):
+        """Closes the cached CSV handle, if open."""
+        if self._csv_fp:
+            self._csv_fp.close()
+            self._csv_fp = None
+            self._csv_writer = None
+
+    def _get_csv_writer(self, csv_file, fieldnames):
+        """Opens the suspended CSV once (line buffered) and caches the handle and writer."""
+        if self._csv_fp is None:
+            import csv
+            file_exists = os.path.exists(csv_file)
+            self._csv_fp = open(csv_file, 'a', newline='', encoding='utf-8', buffering=1)
+            self._csv_writer = csv.writer(self._csv_fp)
+            if not file_exists:
+                self._csv_writer.writerow(fieldnames)
+        return self._csv_fp, self._csv_writer
 
     def _remove_overlays(self, frame):
         """
@@ -118,7 +181,6 @@ class ManageSuspendedQueriesBot:
         if not success:
             self.logger.warning(f"[PAGE] Normal pagination failed for Page {page_index}. Attempting hard refresh...")
             # Perform a full reload of the results page to clear any corrupted viewstate/ajax issues
-            from automation.navigation import navigate_to_download_and_view_results
             if navigate_to_download_and_view_results(page, self.logger):
                 self.logger.info(f"[PAGE] Hard refresh successful. Retrying navigation to Page {page_index} from Page 1...")
                 # Try logic again from a fresh Page 1 state
@@ -130,107 +192,49 @@ class ManageSuspendedQueriesBot:
         """Internal logic for navigating the pager grid."""
         try:
             grid_id = "MainContent_QueryViewControl1_grdvQueryList"
+            grid_unique_id = "ctl00$MainContent$QueryViewControl1$grdvQueryList"
             # Use a loop to handle cases where the page might be multiple '...' sets away
             max_attempts = 15
+            allow_jump = True
             for attempt in range(max_attempts):
-                page.wait_for_timeout(1000) # Small extra wait for stability
-                
-                # Check current visible pages
-                pager_elements_info = page.evaluate(f"""
-                    () => {{
-                        let row = document.querySelector('tr.grid-footer');
-                        if (!row) {{
-                           const rows = Array.from(document.querySelectorAll('#{grid_id} tr'));
-                           row = rows.find(r => {{
-                               const links = r.querySelectorAll('a');
-                               return links.length >= 2 && (r.innerText.includes('...') || 
-                                      Array.from(links).some(a => !isNaN(a.innerText.trim()) && a.innerText.trim() !== ''));
-                           }});
-                        }}
-                        if (!row) return {{ pages: [], has_ellipsis: false }};
-                        const links = Array.from(row.querySelectorAll('td span, td a'));
-                        return {{
-                            pages: links.map(l => l.innerText.trim()).filter(t => !isNaN(t) && t !== ''),
-                            has_ellipsis: Array.from(row.querySelectorAll('a')).some(a => a.innerText.includes('...'))
-                        }};
-                    }}
-                """)
-                
-                visible_pages = [int(p) for p in pager_elements_info.get('pages', [])]
-                has_ellipsis = pager_elements_info.get('has_ellipsis', False)
-                
-                if not visible_pages:
-                    self.logger.info(f"[DEBUG] No visible pages found on attempt {attempt+1}. Waiting...")
-                    page.wait_for_timeout(2000)
-                    continue
+                # Read the pager, then click once towards the target
+                step = pager_step(page, grid_id, page_index, postback_target=grid_unique_id if allow_jump else None)
+                if not step:
+                    self.logger.info(f"[PAGE] No pager pages rendered within 15s (attempt {attempt+1}).")
+                    return False
+
+                visible_pages = {int(p) for p in step['pages']}
+                action = step['action']
 
-                if page_index in visible_pages:
-                    self.logger.info(f"[PAGE] Target Page {page_index} visible. Clicking...")
-                    page.evaluate(f"""
-                        () => {{
-                            const grid = document.getElementById('{grid_id}');
-                            const links = Array.from(grid.querySelectorAll('a'));
-                            const link = links.find(a => a.innerText.trim() === '{page_index}');
-                            if (link) link.click();
-                        }}
-                    """)
-                    page.wait_for_load_state('networkidle')
-                    page.wait_for_timeout(2000)
+                if action == 'current':
                     return True
-                
-                # If target is not in visible pages, use ellipsis if available
-                if has_ellipsis:
-                    highest_visible = max(visible_pages)
-                    
-                    if page_index > highest_visible:
-                        # Trying to go forward. Ensure we have a "Next" ellipsis.
-                        # In .NET GridView, "Next" ellipsis is usually the last anchor.
-                        # If the last visible page (highest_visible) is the last anchor, there's no Next.
-                        
-                        can_go_forward = page.evaluate(f"""
-                            () => {{
-                                const row = document.querySelector('tr.grid-footer');
-                                if (!row) return false;
-                                const links = Array.from(row.querySelectorAll('a'));
-                                if (links.length === 0) return false;
-                                const lastLink = links[links.length - 1];
-                                return lastLink.innerText.includes('...');
-                            }}
-                        """)
-                        
-                        if not can_go_forward:
-                            self.logger.info(f"[PAGE] Page {page_index} requested, but max visible is {highest_visible} and no '...' Next button found. End of list.")
-                            return False
-
-                        idx = -1 # Last ellipsis
-                        direction = "next"
-                    else:
-                        idx = 0 # First ellipsis
-                        direction = "previous"
-
-                    self.logger.info(f"[PAGE] Page {page_index} not visible in {visible_pages}. Clicking {direction} '...' to load more pages.")
-                    page.evaluate(f"""
-                        (index) => {{
-                            const row = document.querySelector('tr.grid-footer');
-                            const ellipses = Array.from(row.querySelectorAll('a')).filter(a => a.innerText.includes('...'));
-                            if (ellipses.length > 0) {{
-                                const target = index === -1 ? ellipses[ellipses.length - 1] : ellipses[0];
-                                target.click();
-                            }}
-                        }}
-                    """, idx)
-                    page.wait_for_load_state('networkidle')
-                    page.wait_for_timeout(3000)
+
+                if action == 'clicked_target':
+                    self.logger.info(f"[PAGE] Target Page {page_index} visible. Clicked.")
+                    if not wait_for_grid_page(page, grid_id, expected=page_index):
+                        self.logger.warning(f"[PAGE] Pager did not confirm Page {page_index} within 15s.")
+                    return True
+
+                if action == 'jumped':
+                    self.logger.info(f"[PAGE] Page {page_index} not visible in {visible_pages}. Posted back to it directly.")
+                    if wait_for_grid_page(page, grid_id, expected=page_index, timeout=10000):
+                        return True
+                    # Postback did not land on the page (e.g. past the end): walk the '...' groups instead
+                    self.logger.info(f"[PAGE] Direct postback to Page {page_index} not confirmed. Falling back to '...' navigation.")
+                    allow_jump = False
+                    continue
+
+                if action == 'clicked_ellipsis':
+                    self.logger.info(f"[PAGE] Page {page_index} not visible in {visible_pages}. Clicked {step['direction']} '...' to load more pages.")
+                    wait_for_grid_page(page, grid_id, previous=step['current'])
+                    continue
+
+                if action == 'end':
+                    self.logger.info(f"[PAGE] Page {page_index} requested, but max visible is {max(visible_pages)} and no '...' Next button found. End of list.")
                 else:
-                    # If no ellipsis and our page is not here
-                    if page_index > max(visible_pages):
-                         self.logger.info(f"[PAGE] Page {page_index} not found and no ellipsis. End of list.")
-                         return False
-
-                    # If no ellipsis and our page is not here, wait a few times then break
-                    if attempt > 5:
-                        break
-                    page.wait_for_timeout(2000)
+                    # The pager has rendered and holds no route to the page: end of list
+                    self.logger.info(f"[PAGE] Page {page_index} not found and no ellipsis. End of list.")
+                return False
             
             return False
         except Exception as e:
@@ -243,7 +247,7 @@ class ManageSuspendedQueriesBot:
             if os.path.exists(path):
                 with open(path, 'r') as f:
                     return int(f.read().strip())
-        except:
+        except (OSError, ValueError):
             pass
         return 1
 
@@ -252,8 +256,8 @@ class ManageSuspendedQueriesBot:
             path = os.path.join(os.getcwd(), 'output', 'suspended', 'last_page.txt')
             with open(path, 'w') as f:
                 f.write(str(page_num))
-        except:
-            pass
+        except OSError as e:
+            self.logger.warning(f"Failed to save last page checkpoint: {e}")
 
     def process_suspended_queries(self, page):
         """Scans for suspended queries and clicks 'Log'."""
@@ -266,54 +270,8 @@ class ManageSuspendedQueriesBot:
         current_page_index = 1
         target_page = self._load_last_page()
         
-        if target_page > 1:
-             self.logger.info(f"[RESUME] Found last processed page: {target_page}. Jumping to it...")
-             # Efficiently jump to target page
-             while current_page_index < target_page:
-                 self.logger.info(f"[RESUME] Fast-forwarding: Seeking Page {target_page} (Current View Highest: ?)")
-                 # We call _handle_pagination with the TARGET page. 
-                 # If target is not visible, it clicks '...' to load next chunk.
-                 # If target IS visible, it clicks it and returns True.
-                 
-                 # Optimization: _handle_pagination might be slow if we call it for every single step if target is far.
-                 # But it handles "..." clicks correctly.
-                 if self._handle_pagination(page, target_page):
-                     self.logger.info(f"[RESUME] Successfully jumped to Page {target_page}.")
-                     current_page_index = target_page
-                     break
-                 
-                 # If it returned False but we are not at target, it meant it clicked '...' 
-                 # Wait, _handle_pagination returns True ONLY if it clicked the specific page link.
-                 # It returns False if it clicked '...' (wait, let's check return values).
-                 # Looking at code: 
-                 # If clicks '...', it waits and returns... wait, the function ends. Default return is False?
-                 # No, lines 212-223 execute click. Then it falls through to return False at line 235.
-                 # So if it clicks '...', it returns False.
-                 # So we just loop. But we need to update our notion of progress?
-                 # Actually _handle_pagination handles the logic of "Target not visible -> Click ...".
-                 # So calling it repeatedly with SAME target_page will eventually reach it.
-                 pass
-                 
-                 # Safety check: If we are stuck (e.g. end of list reached but target not found)
-                 # _handle_pagination logs "End of list" and returns False without clicking.
-                 # We need to detect that loop state.
-                 # Simplified: Just rely on _handle_pagination. If it can't find it, we eventually process whatever page we are on.
-                 # But we need to break if it fails to progress.
-                 # Let's verify _handle_pagination return behavior.
-                 
-        current_page_index = max(1, current_page_index) # Safety
-        # If jump failed or target=1, we start at 1. But if jump succeeded, we are at target_page.
-        
-        # NOTE: logic above might fail if _handle_pagination returns False when clicking '...'.
-        # Let's assume we are at target_page if the loop finishes success.
-        # Actually, let's just update current_page_index to target_page IF we think we are there.
-        # But safer to just rely on the loop below `while True`.
-        # Better Strategy: Set `current_page_index = target_page` at START.
-        # AND Inside loop, `_handle_pagination(page, current_page_index)` will automatically click '...' until it gets there.
-        # YES! That is the beauty of `_handle_pagination`.
-        # It takes `page_index`. If `page_index` (50) is not visible, it clicks `...` repeatedly.
-        # So I just need to set `current_page_index = target_page`.
-        
+        # _handle_pagination clicks '...' until the requested page is visible, so resuming
+        # only needs the starting index; the loop below performs the single jump.
         if target_page > 1:
             self.logger.info(f"[RESUME] Resuming from Page {target_page}...")
             current_page_index = target_page
@@ -378,7 +336,17 @@ class ManageSuspendedQueriesBot:
             # Find all rows with "Suspended" text
             # We iterate all rows to check status text
             rows = page.locator(f'{grid_selector} tr[style*="background-color:White"]')
-            count = rows.count()
+            # Read ID, name and suspended state of every row in one round-trip
+            rows_data = rows.evaluate_all("""rows => rows.map(tr => {
+                const cells = tr.querySelectorAll('td');
+                return {
+                    id: cells[0] ? cells[0].innerText.trim() : '',
+                    name: cells[1] ? cells[1].innerText.trim() : '',
+                    suspended: tr.innerText.includes('Suspended') ||
+                        tr.querySelector('input[src*="Suspended"], td[title*="Suspended"]') !== null
+                };
+            })""")
+            count = len(rows_data)
             
             if count == 0:
                 self.logger.info(f"No data rows found on Page {current_page_index}.")
@@ -388,24 +356,14 @@ class ManageSuspendedQueriesBot:
                 break
 
             found_suspended_on_page = False
-            for i in range(count):
-                row = rows.nth(i)
-                text_content = row.inner_text()
-                
+            for i, row_data in enumerate(rows_data):
                 # Check for "Suspended" in text OR via specific image/title
-                is_suspended = "Suspended" in text_content
-                
-                if not is_suspended:
-                    if (row.locator('input[src*="Suspended"]').count() > 0 or 
-                        row.locator('td[title*="Suspended"]').count() > 0):
-                        is_suspended = True
-
-                if is_suspended:
+                if row_data['suspended']:
                     found_suspended_on_page = True
-                    # Extract ID for logging
+                    row = rows.nth(i)
                     try:
-                        q_id = row.locator('td').nth(0).inner_text().strip()
-                        query_name = row.locator('td').nth(1).inner_text().strip()
+                        q_id = row_data['id']
+                        query_name = row_data['name']
                         
                         # Optimize: Skip if already processed
                         if q_id in self.processed_ids:
@@ -427,12 +385,13 @@ class ManageSuspendedQueriesBot:
                             try:
                                 page.wait_for_selector('iframe[name="rdwndJobReport"]', timeout=10000)
                                 page.wait_for_timeout(1000)  # Reduced from 2000ms - balance speed vs reliability
-                            except:
+                            except PlaywrightTimeoutError:
                                 self.logger.warning(f"   [WARNING] Modal did not appear for query {q_id}")
                             
                             content_found = False
                             target_frame = None
                             content = "" # Initialize content variable
+                            markets_match = None
                             
                             # Check specifically for the Job Report frame
                             job_frame = page.frame(name="rdwndJobReport")
@@ -447,7 +406,7 @@ class ManageSuspendedQueriesBot:
                                     # Wait for content load
                                     try:
                                         job_frame.wait_for_selector('body', timeout=5000)
-                                    except: pass
+                                    except PlaywrightTimeoutError: pass
 
                                     # Initial content check
                                     f_content = job_frame.inner_text('body')
@@ -513,7 +472,7 @@ class ManageSuspendedQueriesBot:
                                             q_def_tab = job_frame.locator('span:has-text("Query Definition"), a:has-text("Query Definition"), li:has-text("Query Definition")').first
                                             try:
                                                 q_def_tab.wait_for(state='attached', timeout=5000)
-                                            except: pass
+                                            except PlaywrightTimeoutError: pass
 
                                             if q_def_tab.count() > 0:
                                                 self.logger.info("   [ACTION] Clicking 'Query Definition' tab...")
@@ -525,8 +484,9 @@ class ManageSuspendedQueriesBot:
                                                 try:
                                                     textarea_loc = job_frame.locator('textarea[name="txtDesc"], textarea[id*="txtDesc"], textarea[name="txtQueryDef"], textarea[id*="txtQueryDef"]').first
                                                     if textarea_loc.count() > 0:
-                                                        extracted_text = textarea_loc.input_value()
-                                                except: pass
+                                                        extracted_text = textarea_loc.input_value(timeout=5000)
+                                                except PlaywrightError as e:
+                                                    self.logger.debug(f"   [DEBUG] Textarea re-read failed: {e}")
                                             else:
                                                 self.logger.warning("   [WARNING] Query Definition tab not found.")
                                         except Exception as e:
@@ -542,8 +502,10 @@ class ManageSuspendedQueriesBot:
                                         pass
 
                                     content = f_content
-                                    if "Markets" in content: # Loose check first
-                                        content_found = True
+                                    # Any 'Markets' text counts as found; the regex only extracts the values
+                                    content_found = "Markets" in content
+                                    if content_found:
+                                        markets_match = _MARKETS_RE.search(content)
                                         target_frame = job_frame
                                 except Exception as e:
                                     self.logger.warning(f"   [FRAME] Error reading job frame: {e}")
@@ -564,7 +526,9 @@ class ManageSuspendedQueriesBot:
                                                 content_found = True
                                                 target_frame = frame
                                                 break
-                                        except: pass
+                                        except PlaywrightError:
+                                            # Frame detached or navigating
+                                            pass
 
                             if True: # Always proceed to save/close for debugging, even if specific text not found
                                 if target_frame:
@@ -573,8 +537,7 @@ class ManageSuspendedQueriesBot:
                                     self.logger.info("   [MODAL] Log modal detected (or fallback used).")
                                 
                                 # Extract info
-                                import re
-                                details = self._extract_details_from_text(content)
+                                details = self._extract_details_from_text(content, markets_match)
                                 
                                 if content_found:
                                     if details['markets'] != "Not Found":
@@ -599,36 +562,26 @@ class ManageSuspendedQueriesBot:
                                                 close_btn.click(timeout=2000)
                                                 closed = True
                                                 page.wait_for_timeout(500)
-                                    except: pass
+                                    except PlaywrightError as e:
+                                        self.logger.debug(f"   [CLOSE] Close button click failed: {e}")
 
                                     # 2. Try Telerik Window "X" button (on main page)
                                     if not closed:
                                         try:
                                             # The wrapper ID usually contains the frame ID logic
                                             wrapper_close = page.locator('.RadWindow .rwCloseButton').first
-                                            if wrapper_close.isVisible():
+                                            if wrapper_close.is_visible():
                                                  wrapper_close.click(timeout=2000)
                                                  closed = True
                                                  page.wait_for_timeout(500)
-                                        except: pass
+                                        except PlaywrightError as e:
+                                            self.logger.debug(f"   [CLOSE] Window close button click failed: {e}")
 
                                     # 3. JS Force Close (The Nuclear Option)
-                                    if not closed or page.locator('iframe[name="rdwndJobReport"]').is_visible():
+                                    # Only when both buttons failed; a click that didn't hide the modal is caught by the verification below
+                                    if not closed:
                                         self.logger.info("   [CLOSE] Forcing modal close via JS...")
-                                        page.evaluate("""
-                                            () => {
-                                                // Try Telerik API
-                                                try {
-                                                    var wnd = $find("ctl00_MainContent_QueryViewControl1_rdwndJobReport");
-                                                    if(wnd) wnd.close();
-                                                } catch(e) {}
-                                                
-                                                // Try DOM removal
-                                                document.querySelectorAll('div[id*="rdwndJobReport"]').forEach(el => el.style.display = 'none');
-                                                document.querySelectorAll('iframe[name="rdwndJobReport"]').forEach(el => el.remove());
-                                                $('.RadWindow').hide(); // If jQuery present
-                                            }
-                                        """)
+                                        page.evaluate("window.__forceCloseModal()")
                                         page.wait_for_timeout(1000)
 
                                     # Verify it's gone - CRITICAL for data alignment
@@ -642,7 +595,7 @@ class ManageSuspendedQueriesBot:
                                                 self.logger.warning(f"   [WARNING] Modal still visible on attempt {attempt+1}/5. Forcing removal...")
                                                 page.evaluate("document.querySelectorAll('iframe[name=\"rdwndJobReport\"]').forEach(el => el.remove());")
                                                 page.wait_for_timeout(500)
-                                        except:
+                                        except PlaywrightError:
                                             modal_closed = True
                                             break
                                     
@@ -687,7 +640,7 @@ class ManageSuspendedQueriesBot:
                              if row.get('reporting_country') != "Not Found" and row.get('years') != "Not Found":
                                  ids.add(row['query_id'])
 
-            except: pass
+            except (OSError, csv.Error): pass
             
         # Fallback/Merge JSON
         json_file = os.path.join(output_dir, 'suspended_details.json')
@@ -699,7 +652,7 @@ class ManageSuspendedQueriesBot:
                     for item in data:
                         if 'query_id' in item:
                             ids.add(item['query_id'])
-            except: pass
+            except (OSError, ValueError): pass
         return ids
 
     def _save_suspended_details(self, question_id, query_name, details):
@@ -707,7 +660,6 @@ class ManageSuspendedQueriesBot:
         Saves extracted details to both JSON and CSV formats.
         """
         import json
-        import csv
         
         # Add to local cache immediately
         self.processed_ids.add(question_id)
@@ -724,21 +676,21 @@ class ManageSuspendedQueriesBot:
             try:
                 with open(json_file, 'r') as f:
                     data = json.load(f)
-            except: pass
+            except (OSError, ValueError): pass
         
-        record = {
-            "query_id": question_id,
-            "query_name": query_name, 
-            "reporting_country": details.get('markets', 'Not Found'),
-            "years": details.get('years', 'Not Found'),
-            "trade_flows": details.get('trade_flows', 'Not Found'),
-            "timestamp": time.time(),
-            "date": time.strftime("%Y-%m-%d %H:%M:%S")
-        }
+        rec = SuspendedRecord(
+            query_id=question_id,
+            query_name=query_name,
+            reporting_country=details.get('markets', 'Not Found'),
+            years=details.get('years', 'Not Found'),
+            trade_flows=details.get('trade_flows', 'Not Found'),
+            timestamp=time.time(),
+            date=time.strftime("%Y-%m-%d %H:%M:%S")
+        )
         
         # Check if record already exists to avoid duplicates
         if not any(d.get('query_id') == question_id for d in data):
-            data.append(record)
+            data.append(asdict(rec))
             with open(json_file, 'w') as f:
                 json.dump(data, f, indent=4)
         
@@ -746,25 +698,17 @@ class ManageSuspendedQueriesBot:
         csv_file = os.path.join(output_dir, 'suspended_queries.csv')
         fieldnames = ['query_id', 'query_name', 'reporting_country', 'years', 'trade_flows', 'date']
         
-        file_exists = os.path.exists(csv_file)
-        
         try:
-            with open(csv_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                if not file_exists:
-                    writer.writeheader()
-                
-                # Filter record to match fieldnames
-                csv_row = {k: record.get(k, '') for k in fieldnames}
-                writer.writerow(csv_row)
+            fp, writer = self._get_csv_writer(csv_file, fieldnames)
+            writer.writerow([rec.query_id, rec.query_name, rec.reporting_country, rec.years, rec.trade_flows, rec.date])
+            fp.flush()
             self.logger.info(f"   [SAVED] Appended to {csv_file}")
         except Exception as e:
             self.logger.error(f"   [ERROR] Failed to write to CSV: {e}")
 
-    def _extract_details_from_text(self, text):
-        """Extracts Market info from text blob."""
+    def _extract_details_from_text(self, text, markets_match=None):
+        """Extracts Market info from text blob, reusing a prior _MARKETS_RE match if given."""
         details = {"markets": "Not Found", "years": "Not Found", "trade_flows": "Not Found"}
-        import re
         
         # Simplify text: normalize newlines and remove phantom spaces
         text = text.replace('\xa0', ' ').replace('\r', '\n')
@@ -779,15 +723,16 @@ class ManageSuspendedQueriesBot:
         # Strategy: Find "Markets...:" then capture lines until double newline or "Partners"
         # We capture the content between "Markets ... :" and the next section header
         
-        markets_match = re.search(r"Markets.*?[:](.+?)(?:Partners|Years|Trade Type|\Z)", text, re.IGNORECASE | re.DOTALL)
+        if markets_match is None:
+            markets_match = _MARKETS_RE.search(text)
         if markets_match:
-            raw_markets = markets_match.group(1).strip()
+            raw_markets = markets_match.group('body').replace('\xa0', ' ').replace('\r', '\n').strip()
             # Clean up: lines often start with tabs/spaces. 
             # Example: "	IRQ	368	Iraq"
             # We want "IRQ 368 Iraq"
-            clean_lines = [line.strip() for line in raw_markets.split('\n') if line.strip()]
-            if clean_lines:
-                details['markets'] = "; ".join(clean_lines)
+            joined = "; ".join(line for line in (l.strip() for l in raw_markets.splitlines()) if line)
+            if joined:
+                details['markets'] = joined
         
         # Fallback: Look for "Reporting Country" if the above failed
         if details['markets'] == "Not Found":
@@ -4,6 +4,7 @@ import os
 import sys
 import re
 import time
+from collections import deque
 
 # Add src to python path for imports to work
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
@@ -29,7 +30,10 @@ class ReprocessSuspendedBot:
     def __init__(self, config):
         self.config = config
         self.logger = setup_logger(self.__class__.__name__)
-        self.browser_manager = BrowserManager(headless=self.config.get('headless', False))
+        self.browser_manager = BrowserManager(
+            headless=self.config.get('headless', False),
+            cdp_endpoint=self.config.get('automation', {}).get('cdp_endpoint')
+        )
         self.suspended_csv = os.path.join('output', 'suspended', 'suspended_queries.csv')
         self.processed_file = os.path.join('output', 'suspended', 'reprocessed_pairs.txt')
         
@@ -84,6 +88,8 @@ class ReprocessSuspendedBot:
         
         # Use a dict to track unique pairs: key=(query_name, iso3), value=(query_name, iso3, reporter_field)
         unique_pairs = {}
+        # Raw (query_name, reporter_field) cells already seen, so repeated rows skip the strip/ISO3 parse
+        seen_raw = set()
         duplicate_count = 0
         
         try:
@@ -91,6 +97,12 @@ class ReprocessSuspendedBot:
                 reader = csv.reader(f)
                 for row_num, row in enumerate(reader, 1):
                     if len(row) >= 3:
+                        raw_key = (row[1], row[2])
+                        if raw_key in seen_raw:
+                            duplicate_count += 1
+                            continue
+                        seen_raw.add(raw_key)
+                        
                         query_name = row[1].strip()
                         reporter_field = row[2].strip()
                         iso3 = self._extract_iso3_from_reporter(reporter_field)
@@ -205,87 +217,39 @@ class ReprocessSuspendedBot:
             
             self.logger.info("Login successful. Starting to process pairs...")
             
-            # Process each pair and track failures
-            success_count = 0
+            # Single work queue: failed pairs are re-queued at the back with their attempt count
+            # bumped, so retries interleave with fresh pairs instead of running as separate passes.
+            max_attempts = 6  # initial attempt + 5 retries
+            total = len(pairs_to_process)
+            work = deque((pair, 0) for pair in pairs_to_process)
             failed_pairs = []
+            success_count = 0
+            processed_count = 0
             
-            for idx, (query_name, iso3, reporter_field) in enumerate(pairs_to_process, 1):
-                if self.process_pair(page, query_name, iso3, reporter_field, idx, len(pairs_to_process)):
+            while work:
+                (query_name, iso3, reporter_field), attempts = work.popleft()
+                processed_count += 1
+                
+                if attempts > 0:
+                    self.logger.info(f"[RETRY] Attempt {attempts + 1}/{max_attempts} for {query_name} | {iso3}")
+                
+                if self.process_pair(page, query_name, iso3, reporter_field, success_count + 1, total):
                     self._mark_as_processed(query_name, iso3)
                     success_count += 1
+                elif attempts + 1 < max_attempts:
+                    work.append(((query_name, iso3, reporter_field), attempts + 1))
                 else:
-                    # Track failed pair
+                    self.logger.info(f"Giving up on {query_name} | {iso3} after {max_attempts} attempts")
                     failed_pairs.append((query_name, iso3, reporter_field))
                 
                 # Wait 10 seconds after every 3 queries
-                if idx % 3 == 0 and idx < len(pairs_to_process):
+                if processed_count % 3 == 0 and work:
                     self.logger.info(f"[THROTTLE] Completed 3 queries. Waiting 10 seconds...")
                     page.wait_for_timeout(10000)
                 # Small delay between queries (if not already waiting)
-                elif idx < len(pairs_to_process):
+                elif work:
                     page.wait_for_timeout(1000)
             
-            self.logger.info("")
-            self.logger.info("="*80)
-            self.logger.info(f"Initial pass completed! Successfully processed {success_count}/{len(pairs_to_process)} pairs")
-            if failed_pairs:
-                self.logger.info(f"Failed pairs: {len(failed_pairs)}")
-            self.logger.info("="*80)
-            
-            # Retry failed pairs - stop if no progress for 5 consecutive attempts
-            max_no_progress_attempts = 5
-            retry_attempt = 0
-            no_progress_count = 0
-            previous_failed_count = len(failed_pairs)
-            
-            while failed_pairs and no_progress_count < max_no_progress_attempts:
-                retry_attempt += 1
-                self.logger.info("")
-                self.logger.info("="*80)
-                self.logger.info(f"RETRY ATTEMPT {retry_attempt}")
-                self.logger.info(f"Retrying {len(failed_pairs)} failed pairs...")
-                self.logger.info("="*80)
-                
-                retry_success_count = 0
-                still_failed = []
-                
-                for idx, (query_name, iso3, reporter_field) in enumerate(failed_pairs, 1):
-                    if self.process_pair(page, query_name, iso3, reporter_field, idx, len(failed_pairs)):
-                        self._mark_as_processed(query_name, iso3)
-                        retry_success_count += 1
-                    else:
-                        # Still failing
-                        still_failed.append((query_name, iso3, reporter_field))
-                    
-                    # Wait 10 seconds after every 3 queries
-                    if idx % 3 == 0 and idx < len(failed_pairs):
-                        self.logger.info(f"[THROTTLE] Completed 3 queries. Waiting 10 seconds...")
-                        page.wait_for_timeout(10000)
-                    # Small delay between queries
-                    elif idx < len(failed_pairs):
-                        page.wait_for_timeout(1000)
-                
-                self.logger.info("")
-                self.logger.info(f"Retry attempt {retry_attempt} completed: {retry_success_count} successes, {len(still_failed)} still failing")
-                
-                # Check if we made progress
-                if len(still_failed) == previous_failed_count:
-                    no_progress_count += 1
-                    self.logger.info(f"No progress made. No-progress count: {no_progress_count}/{max_no_progress_attempts}")
-                    if no_progress_count >= max_no_progress_attempts:
-                        self.logger.info(f"Failed list unchanged for {max_no_progress_attempts} consecutive retries. Stopping.")
-                        failed_pairs = still_failed
-                        break
-                else:
-                    # Made progress, reset counter
-                    no_progress_count = 0
-                    self.logger.info(f"Progress made! Reduced failures from {previous_failed_count} to {len(still_failed)}")
-                
-                # Update for next iteration
-                previous_failed_count = len(still_failed)
-                failed_pairs = still_failed
-
-            
             # Final summary
             self.logger.info("")
             self.logger.info("="*80)
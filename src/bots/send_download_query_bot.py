@@ -1,21 +1,133 @@
-import time
 import sys
 import os
+import re
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Add src to python path for imports to work if running directly
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from utils.logger import setup_logger
+from utils.logger import setup_logger, attach_file_handler
 from automation.browser import BrowserManager
-from automation.login import login
-from automation.navigation import setup_auto_close_popup, navigate_to_download_and_view_results, ensure_popup_closed
+from automation.login import login, is_logged_in
+from automation.navigation import (
+    setup_auto_close_popup,
+    navigate_to_download_and_view_results,
+    ensure_popup_closed,
+    wait_for_any_selector_in_any_frame,
+    pager_step,
+    wait_for_grid_page,
+    current_grid_page
+)
+from playwright.sync_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+# Marker statuses that mean a target is finished; anything else (e.g. "Download Icon Missing") is retried next run
+_COMPLETED_STATUSES = frozenset(("Success", "Data Not Available", "Data Downloaded (Alert)", "Data Downloaded (Modal)"))
+# Alert texts meaning the download job was accepted server-side
+_SUCCESS_RE = re.compile(r"submitted successfully|request status")
+# After the final modal click: how long a success alert may take, and how long a file download may take to start
+_ALERT_WINDOW_MS = 5000
+_DOWNLOAD_TIMEOUT_MS = 30000
+# Marker status for a final click that produced neither an alert nor a download; not completed, so retried next run
+_UNCONFIRMED_STATUS = "Download Not Confirmed"
+
+_GRID_ID = "MainContent_QueryViewControl1_grdvQueryList"
+# Server-side UniqueID of the grid: the event target of its pager postbacks
+_GRID_UNIQUE_ID = "ctl00$MainContent$QueryViewControl1$grdvQueryList"
+_GRID_SEL = f"#{_GRID_ID}"
+# Scope to the specific grid to avoid selecting wrapper rows in nested tables
+_ROW_SEL = f'{_GRID_SEL} tr[style*="background-color:White"]'
+_SELECT_ALL_SEL = 'input[value=">>"], input[id*="btnAll"]'
+_CONFIRM_DL_SEL = 'input[value="Download"], input[value="OK"]'
+
+# Flags every window.alert call so an in-page wait can end as soon as one fires
+_ALERT_FLAG_INIT_JS = """
+if (!window.__alertFlagged) {
+    window.__alertFlagged = true;
+    const nativeAlert = window.alert;
+    window.alert = function() {
+        window.__alertSeen = true;
+        return nativeAlert.apply(this, arguments);
+    };
+}
+"""
+
+# Truthy once an alert has fired or the download modal is visible in the page or a same-origin iframe
+_ALERT_OR_MODAL_JS = """(modalSel) => {
+    if (window.__alertSeen) return 'alert';
+    const docs = [document];
+    document.querySelectorAll('iframe').forEach(f => {
+        try { if (f.contentDocument) docs.push(f.contentDocument); } catch (e) {}
+    });
+    return docs.some(d => Array.from(d.querySelectorAll(modalSel)).some(el => el.offsetParent !== null)) ? 'modal' : false;
+}"""
+
+# Clicks the download icon of each given [row index, query ID] in turn from inside the page.
+# window.alert is captured so every row's message is attributed to it; the batch stops at the
+# first row that opens the download modal (or stays silent) so Python can drive that modal, and
+# at the first row whose ID cell no longer matches (the grid re-rendered since the scan).
+_BATCH_CLICK_JS = """async ([sel, entries, timeout]) => {
+    const modalSel = %s;
+    const modalOpen = () => [document, ...Array.from(document.querySelectorAll('iframe')).map(f => {
+        try { return f.contentDocument; } catch (e) { return null; }
+    }).filter(Boolean)].some(d => Array.from(d.querySelectorAll(modalSel)).some(el => el.offsetParent !== null));
+
+    const results = [];
+    const origAlert = window.alert;
+    let message = null;
+    window.alert = msg => { message = String(msg); };
+    try {
+        for (const [idx, id] of entries) {
+            const row = document.querySelectorAll(sel + ' tr[style*="background-color:White"]')[idx];
+            const idCell = row ? row.children[0] : null;
+            if (!idCell || idCell.innerText.trim() !== id) {
+                results.push({idx, status: 'moved'});
+                break;
+            }
+            const btn = row.querySelector('input[src*="Download"]');
+            if (!btn) {
+                results.push({idx, status: 'missing'});
+                continue;
+            }
+            message = null;
+            btn.click();
+            const start = Date.now();
+            while (message === null && !modalOpen() && Date.now() - start < timeout) {
+                await new Promise(r => setTimeout(r, 50));
+            }
+            if (message === null) {
+                results.push({idx, status: 'modal'});
+                break;
+            }
+            results.push({idx, status: 'alert', message});
+        }
+    } finally {
+        window.alert = origAlert;
+    }
+    return results;
+}""" % repr(_SELECT_ALL_SEL)
 
 class SendDownloadQueryBot:
     def __init__(self, config):
         self.config = config
         self.logger = setup_logger(self.__class__.__name__)
-        self.browser_manager = BrowserManager(headless=self.config.get('headless', False))
+        self.browser_manager = BrowserManager(
+            headless=self.config.get('headless', False),
+            cdp_endpoint=self.config.get('automation', {}).get('cdp_endpoint')
+        )
         self.last_alert = None
+        self.processed_ids = set()
+        # Results page the grid is known to be showing (None when unknown)
+        self._current_grid_page = None
+        # Query ID -> row position on the current grid page, rebuilt after any navigation
+        self._row_index = {}
+        # Direct file downloads are saved here
+        self.download_dir = os.path.join(os.getcwd(), 'downloads')
+        os.makedirs(self.download_dir, exist_ok=True)
+        # Marker file path -> open append handle, shared with worker sessions
+        self._marker_files = {}
+        self._marker_lock = threading.Lock()
 
     def run(self):
         query_name = self.config['credentials'].get('query_name', 'DownloadJob')
@@ -27,13 +139,71 @@ class SendDownloadQueryBot:
                 query_name = "BatchDownload"
         
         log_path = os.path.join('logs', f"download_{query_name}.log")
-        self.logger = setup_logger(self.__class__.__name__, log_file=log_path)
+        attach_file_handler(self.logger, log_path)
         
         # Store sanitized name for markers
         self.sanitized_query_name = query_name
 
+        # Skip queries already marked in a previous run
+        self.processed_ids = self._load_processed_ids(query_name)
+        self.logger.info(f"Loaded {len(self.processed_ids)} processed queries from previous runs.")
+
         self.logger.info(f"Starting SendDownloadQueryBot execution... (Log: {log_path})")
+        
+        workers = int(self.config.get('automation', {}).get('download_workers', 1))
+        try:
+            if workers > 1:
+                self._run_workers(workers)
+            else:
+                self._run_session()
+        finally:
+            self.close()
+
+    def _run_workers(self, workers):
+        """Runs `workers` browser sessions concurrently, pulling result pages from a shared counter."""
+        counter = itertools.count(1)
+        lock = threading.Lock()
+
+        def next_page_index():
+            with lock:
+                return next(counter)
+
+        # Log in once and hand the session cookies to every worker context
+        storage_state = self._login_storage_state()
+
+        self.logger.info(f"[WORKERS] Starting {workers} concurrent download sessions...")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self._run_worker, next_page_index, storage_state) for _ in range(workers)]
+            for future in futures:
+                future.result()
+
+    def _login_storage_state(self):
+        """Logs in with a short-lived browser and returns its storage_state, or None on failure."""
         page = self.browser_manager.start()
+        try:
+            setup_auto_close_popup(page, self.logger)
+            creds = self.config['credentials']
+            if login(page, creds['email'], creds['password'], self.config['urls']['login'], self.logger):
+                return page.context.storage_state()
+        except Exception as e:
+            self.logger.warning(f"[WORKERS] Shared login failed, workers will log in individually: {e}")
+        finally:
+            self.browser_manager.stop()
+        return None
+
+    def _run_worker(self, next_page_index, storage_state=None):
+        """Runs one worker session with its own browser and alert state."""
+        worker = SendDownloadQueryBot(self.config)
+        worker.logger = self.logger
+        worker.sanitized_query_name = self.sanitized_query_name
+        worker.processed_ids = self.processed_ids
+        worker._marker_files = self._marker_files
+        worker._marker_lock = self._marker_lock
+        worker._run_session(next_page_index, storage_state)
+
+    def _run_session(self, next_page_index=None, storage_state=None):
+        """Starts a browser, logs in (unless `storage_state` restores a session) and processes result pages."""
+        page = self.browser_manager.start(storage_state=storage_state)
         
         try:
             # 1. Register Modal Handler
@@ -41,12 +211,15 @@ class SendDownloadQueryBot:
 
             # 2. Login
             creds = self.config['credentials']
-            if not login(page, creds['email'], creds['password'], self.config['urls']['login'], self.logger):
+            login_url = self.config['urls']['login']
+            if storage_state and is_logged_in(page, login_url, self.logger):
+                self.logger.info("Reusing shared login session.")
+            elif not login(page, creds['email'], creds['password'], login_url, self.logger):
                 self.logger.error("Login failed. Aborting.")
                 return
 
             # 3. Process Downloads
-            self.process_downloads(page)
+            self.process_downloads(page, next_page_index)
             
             # Keep browser open if not headless
             if not self.config.get('headless', False):
@@ -71,7 +244,6 @@ class SendDownloadQueryBot:
         if not success:
             self.logger.warning(f"[PAGE] Normal pagination failed for Page {page_index}. Attempting hard refresh...")
             # Perform a full reload of the results page to clear any corrupted viewstate/ajax issues
-            from automation.navigation import navigate_to_download_and_view_results
             if navigate_to_download_and_view_results(page, self.logger):
                 self.logger.info(f"[PAGE] Hard refresh successful. Retrying navigation to Page {page_index} from Page 1...")
                 # Try logic again from a fresh Page 1 state
@@ -79,87 +251,81 @@ class SendDownloadQueryBot:
         
         return success
 
+    def _ensure_on_page(self, page, page_index):
+        """Makes sure the grid shows `page_index`, skipping all navigation when it already does."""
+        grid_visible = page.locator(_GRID_SEL).is_visible()
+        if grid_visible and self._current_grid_page is None:
+            # State dropped after a modal or postback: trust the pager instead of navigating again
+            self._current_grid_page = current_grid_page(page, _GRID_ID)
+        if grid_visible and self._current_grid_page == page_index:
+            return True
+
+        self._row_index = {}
+
+        if not grid_visible or self._current_grid_page is None or page_index == 1:
+            # Grid state unknown (e.g. a download navigated away): start again from Page 1
+            if not navigate_to_download_and_view_results(page, self.logger):
+                self._current_grid_page = None
+                return False
+            self._current_grid_page = 1
+            if page_index == 1:
+                return True
+
+        if not self._handle_pagination(page, page_index):
+            self._current_grid_page = None
+            return False
+        self._current_grid_page = page_index
+        return True
+
     def _do_pagination_logic(self, page, page_index):
         """Internal logic for navigating the pager grid."""
         try:
-            grid_id = "MainContent_QueryViewControl1_grdvQueryList"
             # Use a loop to handle cases where the page might be multiple '...' sets away
             max_attempts = 15
+            grid = page.locator(_GRID_SEL)
+            allow_jump = True
             for attempt in range(max_attempts):
-                page.wait_for_timeout(1000) # Small extra wait for stability
-                
-                # Check current visible pages
-                pager_elements_info = page.evaluate(f"""
-                    () => {{
-                        let row = document.querySelector('tr.grid-footer');
-                        if (!row) {{
-                           const rows = Array.from(document.querySelectorAll('#{grid_id} tr'));
-                           row = rows.find(r => {{
-                               const links = r.querySelectorAll('a');
-                               return links.length >= 2 && (r.innerText.includes('...') || 
-                                      Array.from(links).some(a => !isNaN(a.innerText.trim()) && a.innerText.trim() !== ''));
-                           }});
-                        }}
-                        if (!row) return {{ pages: [], has_ellipsis: false }};
-                        const links = Array.from(row.querySelectorAll('td span, td a'));
-                        return {{
-                            pages: links.map(l => l.innerText.trim()).filter(t => !isNaN(t) && t !== ''),
-                            has_ellipsis: Array.from(row.querySelectorAll('a')).some(a => a.innerText.includes('...'))
-                        }};
-                    }}
-                """)
-                
-                visible_pages = [int(p) for p in pager_elements_info.get('pages', [])]
-                has_ellipsis = pager_elements_info.get('has_ellipsis', False)
-                
-                if not visible_pages:
-                    self.logger.info(f"[DEBUG] No visible pages found on attempt {attempt+1}. Waiting...")
-                    page.wait_for_timeout(2000)
-                    continue
+                grid.wait_for(state='visible', timeout=15000)
+                # Read the pager, then click once towards the target
+                step = pager_step(page, _GRID_ID, page_index, postback_target=_GRID_UNIQUE_ID if allow_jump else None)
+                if not step:
+                    self.logger.info(f"[PAGE] No pager pages rendered within 15s (attempt {attempt+1}).")
+                    return False
+
+                visible_pages = {int(p) for p in step['pages']}
+                action = step['action']
 
-                if page_index in visible_pages:
-                    self.logger.info(f"[PAGE] Target Page {page_index} visible. Clicking...")
-                    page.evaluate(f"""
-                        () => {{
-                            const grid = document.getElementById('{grid_id}');
-                            const links = Array.from(grid.querySelectorAll('a'));
-                            const link = links.find(a => a.innerText.trim() === '{page_index}');
-                            if (link) link.click();
-                        }}
-                    """)
-                    page.wait_for_load_state('networkidle')
-                    page.wait_for_timeout(2000)
+                if action == 'current':
                     return True
-                
-                # If target is not in visible pages, use ellipsis if available
-                if has_ellipsis:
-                    highest_visible = max(visible_pages)
-                    
-                    if page_index > highest_visible:
-                        idx = -1 # Last ellipsis
-                        direction = "next"
-                    else:
-                        idx = 0 # First ellipsis
-                        direction = "previous"
-
-                    self.logger.info(f"[PAGE] Page {page_index} not visible in {visible_pages}. Clicking {direction} '...' to load more pages.")
-                    page.evaluate(f"""
-                        (index) => {{
-                            const row = document.querySelector('tr.grid-footer');
-                            const ellipses = Array.from(row.querySelectorAll('a')).filter(a => a.innerText.includes('...'));
-                            if (ellipses.length > 0) {{
-                                const target = index === -1 ? ellipses[ellipses.length - 1] : ellipses[0];
-                                target.click();
-                            }}
-                        }}
-                    """, idx)
-                    page.wait_for_load_state('networkidle')
-                    page.wait_for_timeout(3000)
+
+                if action == 'clicked_target':
+                    self.logger.info(f"[PAGE] Target Page {page_index} visible. Clicked.")
+                    if not wait_for_grid_page(page, _GRID_ID, expected=page_index):
+                        self.logger.warning(f"[PAGE] Pager did not confirm Page {page_index} within 15s.")
+                    grid.wait_for(state='visible', timeout=15000)
+                    return True
+
+                if action == 'jumped':
+                    self.logger.info(f"[PAGE] Page {page_index} not visible in {visible_pages}. Posted back to it directly.")
+                    if wait_for_grid_page(page, _GRID_ID, expected=page_index, timeout=10000):
+                        grid.wait_for(state='visible', timeout=15000)
+                        return True
+                    # Postback did not land on the page (e.g. past the end): walk the '...' groups instead
+                    self.logger.info(f"[PAGE] Direct postback to Page {page_index} not confirmed. Falling back to '...' navigation.")
+                    allow_jump = False
+                    continue
+
+                if action == 'clicked_ellipsis':
+                    self.logger.info(f"[PAGE] Page {page_index} not visible in {visible_pages}. Clicked {step['direction']} '...' to load more pages.")
+                    wait_for_grid_page(page, _GRID_ID, previous=step['current'])
+                    continue
+
+                if action == 'end':
+                    self.logger.info(f"[PAGE] Page {page_index} requested, but max visible is {max(visible_pages)} and no '...' Next button found. End of list.")
                 else:
-                    # If no ellipsis and our page is not here, wait a few times then break
-                    if attempt > 5:
-                        break
-                    page.wait_for_timeout(2000)
+                    # The pager has rendered and holds no route to the page: end of list
+                    self.logger.info(f"[PAGE] Page {page_index} not found and no ellipsis. End of list.")
+                return False
             
             return False
         except Exception as e:
@@ -169,60 +335,158 @@ class SendDownloadQueryBot:
     def _get_targets_on_page(self, page):
         """Scans the current page and returns a list of target queries."""
         ensure_popup_closed(page, self.logger)
-        grid_selector = '#MainContent_QueryViewControl1_grdvQueryList'
-        row_locator = page.locator(f'{grid_selector} tr[style*="background-color:White"]')
-        
-        row_count = row_locator.count()
-        targets = []
-        for i in range(row_count):
-            row = row_locator.nth(i)
-            cells = row.locator('td')
-            q_id = cells.nth(0).inner_text().strip()
-            q_name = cells.nth(1).inner_text().strip()
-            targets.append({"id": q_id, "name": q_name})
+        # Read every data row in one round-trip; 'idx' is the row's position for the later click
+        targets = page.evaluate("""(rowSel) => {
+            const rows = Array.from(document.querySelectorAll(rowSel));
+            return rows.map((tr, i) => {
+                const td = tr.children;
+                return {
+                    idx: i,
+                    id: td[0] ? td[0].innerText.trim() : '',
+                    name: td[1] ? td[1].innerText.trim() : ''
+                };
+            });
+        }""", _ROW_SEL)
+        self._row_index = {t['id']: t['idx'] for t in targets}
         return targets
 
+    def _row_position(self, page, target_id):
+        """Returns the grid row index for a query ID, rescanning the page if the map was invalidated."""
+        if not self._row_index:
+            self._get_targets_on_page(page)
+        return self._row_index.get(target_id)
+
+    def _target_row(self, page, target_id):
+        """
+        Returns the grid row locator for a query ID, or None if it is no longer on the page.
+        The cached position is checked against the row's ID cell and rescanned once on a mismatch.
+        """
+        for _ in range(2):
+            row_idx = self._row_position(page, target_id)
+            if row_idx is None:
+                return None
+            row = page.locator(_ROW_SEL).nth(row_idx)
+            try:
+                if row.locator('td').first.inner_text(timeout=5000).strip() == target_id:
+                    return row
+            except PlaywrightTimeoutError:
+                pass
+            # The grid re-rendered since the scan: drop the map so the next lookup rescans
+            self._row_index = {}
+        return None
+
+    def _invalidate_grid_state(self):
+        """Forgets the row map and current page after anything that may re-render the grid."""
+        self._row_index = {}
+        self._current_grid_page = None
+
     def _handle_download_modal(self, page, target_id):
-        """Handles the multi-step download modal interaction."""
-        select_all_btn_selector = 'input[value=">>"], input[id*="btnAll"]'
-        confirm_dl_selector = 'input[value="Download"], input[value="OK"]'
-        
-        # Remove Qualtrics if present
+        """
+        Handles the multi-step download modal interaction.
+        Returns the marker status to record, or None if the modal could not be completed.
+        """
+        # Single push-based wait for whichever modal step renders first, in any frame
+        hit, frame = wait_for_any_selector_in_any_frame(
+            page, {'transfer': _SELECT_ALL_SEL, 'final': _CONFIRM_DL_SEL}, timeout=5000)
+        if not frame:
+            return None
+
         try:
-            page.evaluate("document.querySelectorAll('div[class*=\"QSI\"], div[id*=\"QSI\"]').forEach(el => el.remove());")
-        except: pass
+            btn_final = frame.locator(_CONFIRM_DL_SEL).first
+            if hit == 'transfer':
+                btn_all = frame.locator(_SELECT_ALL_SEL).first
+                self.logger.info("   [MODAL] Modal found. Clicking 'Select All'...")
+                ensure_popup_closed(page, self.logger)
+                self.last_alert = None
+                btn_all.click()
+                
+                # Wait for the confirm button instead of a fixed pause
+                try:
+                    btn_final.wait_for(state='visible', timeout=5000)
+                except PlaywrightTimeoutError:
+                    pass
+            else:
+                self.logger.info("   [MODAL] Confirm button already visible. Skipping 'Select All'.")
+            
+            # Check for immediate success alert after Select All
+            if self.last_alert and _SUCCESS_RE.search(self.last_alert):
+                 self.logger.info(f"   [SUCCESS] Job submitted successfully for ID {target_id}.")
+                 return "Data Downloaded (Modal)"
+            
+            if btn_final.is_visible():
+                ensure_popup_closed(page, self.logger)
+                downloads = []
+                page.once("download", downloads.append)
+                # Only an alert raised by this click counts as its outcome
+                self.last_alert = None
+                btn_final.click()
+                
+                # A success alert (job submitted server-side) comes quickly; a large file download may take longer to start
+                alert = self._wait_for_alert_or_download(page, downloads, timeout=_ALERT_WINDOW_MS)
+                if alert and _SUCCESS_RE.search(alert):
+                    self.logger.info(f"   [SUCCESS] Job submitted successfully for ID {target_id}.")
+                    return "Data Downloaded (Modal)"
 
-        for frame in page.frames:
-            try:
-                btn_all = frame.locator(select_all_btn_selector).first
-                if btn_all.is_visible():
-                    self.logger.info("   [MODAL] Modal found. Clicking 'Select All'...")
-                    ensure_popup_closed(page, self.logger)
-                    btn_all.click()
-                    page.wait_for_timeout(2000)
-                    
-                    # Check for immediate success alert after Select All
-                    if self.last_alert and any(msg in self.last_alert for msg in ["submitted successfully", "request status"]):
-                         self.logger.info(f"   [SUCCESS] Job submitted successfully for ID {target_id}.")
-                         return True
-                    
-                    btn_final = frame.locator(confirm_dl_selector).first
-                    if btn_final.is_visible():
-                        ensure_popup_closed(page, self.logger)
-                        btn_final.click()
-                        
-                        # Monitor for success alert
-                        dl_start = time.time()
-                        while time.time() - dl_start < 5:
-                            ensure_popup_closed(page, self.logger)
-                            if self.last_alert and any(msg in self.last_alert for msg in ["submitted successfully", "request status"]):
-                                self.logger.info(f"   [SUCCESS] Job submitted successfully for ID {target_id}.")
-                                return True
-                            page.wait_for_timeout(200)
-                        return True # Assume triggered if no error
-            except Exception:
-                continue
-        return False
+                if downloads:
+                    download = downloads[0]
+                else:
+                    page.remove_listener("download", downloads.append)
+                    self.logger.info(f"   [CHECK] No alert for ID {target_id}. Waiting up to {_DOWNLOAD_TIMEOUT_MS // 1000}s for the download...")
+                    try:
+                        download = page.wait_for_event("download", timeout=_DOWNLOAD_TIMEOUT_MS - _ALERT_WINDOW_MS)
+                    except PlaywrightTimeoutError:
+                        self.logger.warning(f"   [CHECK] No alert or download for ID {target_id} within {_DOWNLOAD_TIMEOUT_MS // 1000}s.")
+                        return _UNCONFIRMED_STATUS
+
+                save_path = os.path.join(self.download_dir, download.suggested_filename)
+                download.save_as(save_path)
+                self.logger.info(f"   [SUCCESS] Saved download for ID {target_id} to {save_path}")
+                return "Data Downloaded (Modal)"
+        except PlaywrightTimeoutError as e:
+            self.logger.warning(f"   [MODAL] Timed out driving the download modal for ID {target_id}: {e}")
+        return None
+
+    def _wait_for_alert(self, page, timeout=5000):
+        """
+        Blocks until a browser alert fires (or the timeout elapses) and returns its message.
+        Callers clear `last_alert` before the click; an alert that fired in between is returned at once.
+        """
+        if self.last_alert:
+            return self.last_alert
+        try:
+            dialog = page.wait_for_event('dialog', timeout=timeout)
+            self.last_alert = dialog.message
+        except PlaywrightTimeoutError:
+            pass
+        return self.last_alert
+
+    def _wait_for_alert_or_download(self, page, downloads, timeout=5000):
+        """
+        Waits until an alert fires or a download starts (appended to `downloads` by a listener), whichever
+        comes first, and returns the alert message if any. Sync Playwright only dispatches events inside
+        its own calls, so this waits in short slices.
+        """
+        for _ in range(max(1, timeout // 100)):
+            if self.last_alert or downloads:
+                break
+            page.wait_for_timeout(100)
+        return self.last_alert
+
+    def _wait_for_alert_or_modal(self, page, timeout=5000):
+        """
+        Blocks until an alert fires or the download modal renders (or the timeout elapses).
+        Returns the alert message, if any.
+        """
+        if self.last_alert:
+            return self.last_alert
+        try:
+            page.wait_for_function(_ALERT_OR_MODAL_JS, arg=f"{_SELECT_ALL_SEL}, {_CONFIRM_DL_SEL}", timeout=timeout)
+        except PlaywrightTimeoutError:
+            pass
+        except PlaywrightError:
+            # The click navigated and destroyed the document mid-wait; wait on the dialog event instead
+            return self._wait_for_alert(page, timeout)
+        return self.last_alert
 
     def _process_target(self, page, target):
         """Encapsulates the lifecycle of processing a single download target."""
@@ -230,9 +494,10 @@ class SendDownloadQueryBot:
         self.last_alert = None
         
         ensure_popup_closed(page, self.logger)
-        # Scope to the specific grid to avoid selecting wrapper rows in nested tables
-        grid_selector = '#MainContent_QueryViewControl1_grdvQueryList'
-        target_row = page.locator(f'{grid_selector} tr').filter(has_text=target['id']).first
+        target_row = self._target_row(page, target['id'])
+        if target_row is None:
+            self.logger.warning(f"   [WARNING] ID {target['id']} is no longer on this page. Skipping.")
+            return False
         
         download_icon = target_row.locator('input[src*="Download"]')
         
@@ -243,49 +508,122 @@ class SendDownloadQueryBot:
             self._record_success(self.sanitized_query_name, target['id'], status="Download Icon Missing")
             return True
 
+        page.evaluate("window.__alertSeen = false")
         download_icon.click(force=True)
+        # The alert or modal postback may re-render the grid
+        self._invalidate_grid_state()
         self.logger.info("   [DOWNLOAD] Download icon clicked. Monitoring for alerts/modal...")
         
-        # Wait and check for immediate alerts (e.g. "Data not available")
-        start_wait = time.time()
-        while time.time() - start_wait < 5:
-            ensure_popup_closed(page, self.logger)
-            if self.last_alert:
-                if "Data is not available" in self.last_alert:
-                    self.logger.warning(f"   [SKIP] Skipping ID {target['id']}: Data not available.")
-                    self._record_success(self.sanitized_query_name, target['id'], status="Data Not Available")
-                    return True
-                if any(msg in self.last_alert for msg in ["submitted successfully", "request status"]):
-                    self.logger.info(f"   [SUCCESS] Job submitted successfully for ID {target['id']}.")
-                    self._record_success(self.sanitized_query_name, target['id'], status="Data Downloaded (Alert)")
-                    return True
-            page.wait_for_timeout(500)
+        # Wait for an immediate alert (e.g. "Data not available"), returning early once the modal shows instead
+        alert = self._wait_for_alert_or_modal(page, timeout=5000)
+        if alert:
+            if "Data is not available" in alert:
+                self.logger.warning(f"   [SKIP] Skipping ID {target['id']}: Data not available.")
+                self._record_success(self.sanitized_query_name, target['id'], status="Data Not Available")
+                return True
+            if _SUCCESS_RE.search(alert):
+                self.logger.info(f"   [SUCCESS] Job submitted successfully for ID {target['id']}.")
+                self._record_success(self.sanitized_query_name, target['id'], status="Data Downloaded (Alert)")
+                return True
         
         # Check for modal logic
         self.logger.info("   [CHECK] No immediate alert. checking for modal...")
-        page.wait_for_timeout(1000)
-        
-        # Track initial file count in downloads to verify if a new file appears
-        downloads_dir = os.path.join(os.getcwd(), 'downloads')
-        initial_files = set(os.listdir(downloads_dir)) if os.path.exists(downloads_dir) else set()
 
-        if self._handle_download_modal(page, target['id']):
-             # Verification logic
-             self._record_success(self.sanitized_query_name, target['id'], status="Data Downloaded (Modal)")
+
+        status = self._handle_download_modal(page, target['id'])
+        if status:
+             self._record_success(self.sanitized_query_name, target['id'], status=status)
              return True
             
         self.logger.warning(f"   [FAILED] Could not complete download sequence for ID {target['id']}")
         self._record_failure(self.sanitized_query_name, target['id'])
         return False
 
+    def _batch_process_targets(self, page, targets):
+        """
+        Clicks the targets' download icons from one in-page script instead of one round-trip each.
+        Returns the targets that still need the per-target flow.
+        """
+        ensure_popup_closed(page, self.logger)
+        by_idx = {}
+        for t in targets:
+            row_idx = self._row_position(page, t['id'])
+            if row_idx is not None:
+                by_idx[row_idx] = t
+        try:
+            results = page.evaluate(_BATCH_CLICK_JS, [_GRID_SEL, [[idx, t['id']] for idx, t in by_idx.items()], 5000])
+        except Exception as e:
+            self.logger.warning(f"[BATCH] In-page batch click failed: {e}. Falling back to per-target flow.")
+            self._invalidate_grid_state()
+            return targets
+        # The alerts and modal below may re-render the grid
+        self._invalidate_grid_state()
+
+        handled = set()
+        for result in results:
+            target = by_idx[result['idx']]
+            if result['status'] == 'moved':
+                self.logger.info(f"[TARGET] Row for ID {target['id']} moved since the scan; it will be looked up again.")
+                continue
+            handled.add(target['id'])
+            message = result.get('message') or ''
+            self.logger.info(f"[TARGET] Batch result for ID {target['id']} ({target['name']}): {result['status']} {message}")
+
+            if result['status'] == 'missing':
+                self._record_success(self.sanitized_query_name, target['id'], status="Download Icon Missing")
+            elif "Data is not available" in message:
+                self._record_success(self.sanitized_query_name, target['id'], status="Data Not Available")
+            elif _SUCCESS_RE.search(message):
+                self._record_success(self.sanitized_query_name, target['id'], status="Data Downloaded (Alert)")
+            else:
+                # Icon already clicked: drive the modal from Python
+                self.last_alert = None
+                status = self._handle_download_modal(page, target['id'])
+                if status:
+                    self._record_success(self.sanitized_query_name, target['id'], status=status)
+                else:
+                    self.logger.warning(f"   [FAILED] Could not complete download sequence for ID {target['id']}")
+                    self._record_failure(self.sanitized_query_name, target['id'])
+
+        return [t for t in targets if t['id'] not in handled]
+
+    def _load_processed_ids(self, query_name):
+        """Loads target IDs whose marker records a real completion (see _COMPLETED_STATUSES)."""
+        ids = set()
+        marker_file = os.path.join(os.getcwd(), 'output', 'dwnldExecute', f"{query_name}_downloads")
+        if os.path.exists(marker_file):
+            try:
+                with open(marker_file, 'r') as f:
+                    for line in f:
+                        target_id, _, status = line.strip().partition(' - ')
+                        if target_id and status in _COMPLETED_STATUSES:
+                            ids.add(target_id)
+            except Exception as e:
+                self.logger.warning(f"Failed to load processed IDs from {marker_file}: {e}")
+        return ids
+
+    def _append_marker(self, path, line):
+        """Appends a line to a marker file, keeping one line-buffered handle open per file."""
+        with self._marker_lock:
+            fp = self._marker_files.get(path)
+            if fp is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fp = self._marker_files[path] = open(path, 'a', buffering=1)
+            fp.write(f"{line}\n")
+
+    def close(self):
+        """Closes the marker file handles opened during the run."""
+        with self._marker_lock:
+            for fp in self._marker_files.values():
+                fp.close()
+            self._marker_files.clear()
+
     def _record_success(self, query_name, target_id, status="Success"):
         """Writes the target ID to the success marker file with status."""
+        self.processed_ids.add(target_id)
         try:
-            output_dir = os.path.join(os.getcwd(), 'output', 'dwnldExecute')
-            os.makedirs(output_dir, exist_ok=True)
-            output_file = os.path.join(output_dir, f"{query_name}_downloads")
-            with open(output_file, 'a') as f:
-                f.write(f"{target_id} - {status}\n")
+            output_file = os.path.join(os.getcwd(), 'output', 'dwnldExecute', f"{query_name}_downloads")
+            self._append_marker(output_file, f"{target_id} - {status}")
             self.logger.info(f"   [MARKER] Marked {target_id} as complete in {output_file}")
         except Exception as e:
             self.logger.error(f"   [MARKER] Failed to write success marker: {e}")
@@ -293,38 +631,41 @@ class SendDownloadQueryBot:
     def _record_failure(self, query_name, target_id):
         """Writes the target ID to the failure marker file."""
         try:
-            output_dir = os.path.join(os.getcwd(), 'output', 'undone_tasks')
-            os.makedirs(output_dir, exist_ok=True)
-            output_file = os.path.join(output_dir, f"{query_name}_failed_downloads.txt")
-            with open(output_file, 'a') as f:
-                f.write(f"{target_id}\n")
+            output_file = os.path.join(os.getcwd(), 'output', 'undone_tasks', f"{query_name}_failed_downloads.txt")
+            self._append_marker(output_file, target_id)
             self.logger.info(f"   [MARKER] Marked {target_id} as failed in {output_file}")
         except Exception as e:
             self.logger.error(f"   [MARKER] Failed to write failure marker: {e}")
 
-    def process_downloads(self, page):
-        """Coorders the scanning and downloading of completed queries."""
+    def process_downloads(self, page, next_page_index=None):
+        """
+        Coorders the scanning and downloading of completed queries.
+        `next_page_index` hands out page numbers; concurrent workers share one so each page is visited once.
+        """
         self.logger.info("[SCAN] Scanning for completed queries to download...")
-        os.makedirs(os.path.join(os.getcwd(), 'downloads'), exist_ok=True)
-        
         # Setup Alert Handler
         def handle_dialog(dialog):
             self.logger.info(f"[ALERT] Browser Alert Detected: '{dialog.message}' -> Clicking OK/Accept")
             self.last_alert = dialog.message
             dialog.accept()
         page.on("dialog", handle_dialog)
+        page.add_init_script(_ALERT_FLAG_INIT_JS)
 
         if not navigate_to_download_and_view_results(page, self.logger):
             self.logger.error("[ERROR] Failed to navigate to results page.")
             return
+        self._current_grid_page = 1
+
+        if next_page_index is None:
+            next_page_index = itertools.count(1).__next__
 
-        current_page_index = 1
         while True:
+            current_page_index = next_page_index()
             self.logger.info(f"\n{'='*40}")
             self.logger.info(f"[PAGE] Processing Results Page {current_page_index}")
             self.logger.info(f"{'='*40}")
             
-            if not self._handle_pagination(page, current_page_index):
+            if not self._ensure_on_page(page, current_page_index):
                 break
 
             targets = self._get_targets_on_page(page)
@@ -332,7 +673,23 @@ class SendDownloadQueryBot:
                 self.logger.info(f"[INFO] No data rows found on Page {current_page_index}.")
                 break
 
-            for target in targets:
+            pending = [t for t in targets if t['id'] not in self.processed_ids]
+            if len(pending) < len(targets):
+                self.logger.info(f"[SKIP] {len(targets) - len(pending)} queries on Page {current_page_index} already processed.")
+
+            if self.config.get('automation', {}).get('batch_download_clicks', False):
+                # Each batch stops at the first modal; keep batching the rest while it makes progress
+                while pending and self._ensure_on_page(page, current_page_index):
+                    remaining = self._batch_process_targets(page, pending)
+                    if len(remaining) == len(pending):
+                        break
+                    pending = remaining
+
+            for target in pending:
+                if not self._ensure_on_page(page, current_page_index):
+                    break
+                url_before = page.url
                 self._process_target(page, target)
-            
-            current_page_index += 1
\ No newline at end of file
+                if page.url != url_before:
+                    # The download navigated away; re-navigate before the next target
+                    self._current_grid_page = None
\ No newline at end of file
@@ -1,31 +1,66 @@
 
 import json
+import random
 import time
 import sys
 import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
 # Add src to python path for imports to work if running directly
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from utils.logger import setup_logger
-from automation.browser import BrowserManager
-from automation.login import login
+from utils.logger import setup_logger, attach_file_handler, shutdown_logging
+from utils.playwright_patch import apply_playwright_patch
+from utils.json_io import write_json_atomic
+from utils.retry import retry_step
+from automation.browser import BrowserManager, load_storage_state, session_file_for
+from automation.login import login, is_logged_in
 from automation.navigation import (
     navigate_to_trade_data, 
     select_existing_query, 
     click_final_submit, 
-    setup_auto_close_popup 
+    setup_auto_close_popup,
+    return_to_reporter_step
 )
 from automation.reporter import handle_reporter_modification
 
+# Countries averaged for the ETA; recent ones only, so a slow cold start stops skewing it
+ETA_WINDOW = 32
+
 class SendQueryBot:
     def __init__(self, config):
         self.config = config
         self.logger = setup_logger(self.__class__.__name__)
-        self.browser_manager = BrowserManager(headless=self.config.get('headless', False))
+        # Only this bot blocks resources: the download/manage/delete bots click <input type="image"> icons
+        self.browser_manager = BrowserManager(
+            headless=self.config.get('headless', False),
+            cdp_endpoint=self.config.get('automation', {}).get('cdp_endpoint'),
+            blocked_resource_types=self.config.get('automation', {}).get('block_resource_types'),
+            blocked_hosts=self.config.get('automation', {}).get('block_hosts')
+        )
+        self._all_iso3 = config.get('_iso3_items') or tuple(config['iso3_to_country'].items())
         self.start_time = None
-        self.processing_times = []
+        self.processing_times = deque(maxlen=ETA_WINDOW)
+        # Country workers append to processing_times concurrently
+        self._times_lock = threading.Lock()
         self.count = 3
+        # Success marker path -> open append handle (shared with country workers)
+        self._marker_files = {}
+        self._marker_lock = threading.Lock()
+        # Guards undone_countries while country workers remove finished keys
+        self._undone_lock = threading.Lock()
+        # Concurrent country sessions, used to scale the ETA
+        self._active_workers = 1
+        # Per-thread page state, so country workers can share this bot
+        self._session_local = threading.local()
+        # Attempts per page step before the session is given up and refreshed
+        self._step_attempts = int(self.config.get('retries', {}).get('per_step', 2))
+        # Cookies of the last logged-in context, restored into the next iteration's context.
+        # With automation.session_state_file they also survive across runs, skipping login entirely.
+        self._session_file = self.config.get('automation', {}).get('session_state_file')
+        self._session_state = load_storage_state(self._session_file)
 
     def save_undone_countries(self, query_name, undone_countries):
         """Saves each undone country as an individual JSON file in a folder."""
@@ -43,23 +78,42 @@ class SendQueryBot:
                     "country_name": country_name,
                     "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
                 }
-                with open(filename, 'w') as f:
-                    json.dump(data, f, indent=4)
+                write_json_atomic(filename, data)
             
             self.logger.info(f"Saved {len(undone_countries)} individual undone task files to {folder_name}")
         except Exception as e:
             self.logger.error(f"Failed to save granular undone countries: {e}")
 
+    def _checkpoint_path(self, query_name):
+        """Path of the query's undone-countries checkpoint."""
+        return os.path.join('output', 'undone_tasks', f"{query_name}.json")
+
+    def _checkpoint(self, query_name, undone_countries):
+        """Atomically rewrites the query's undone-countries checkpoint, so a killed run resumes where it stopped."""
+        try:
+            write_json_atomic(self._checkpoint_path(query_name), undone_countries)
+        except OSError as e:
+            self.logger.error(f"Failed to checkpoint undone countries for {query_name}: {e}")
+
+    def _clear_checkpoint(self, query_name):
+        """Removes the checkpoint once every country of the query is done."""
+        try:
+            os.remove(self._checkpoint_path(query_name))
+        except FileNotFoundError:
+            pass
+
     def log_country_progress(self, query_name, key, country_idx, total_count, duration):
         """Logs statistics and ETA after completing a country."""
-        self.processing_times.append(duration)
-        avg_time = sum(self.processing_times) / len(self.processing_times)
+        # Bounded window: the sum stays O(ETA_WINDOW) however long the run
+        with self._times_lock:
+            self.processing_times.append(duration)
+            avg_time = sum(self.processing_times) / len(self.processing_times)
         remaining = total_count - country_idx
         
-        eta_seconds = avg_time * remaining
+        eta_seconds = avg_time * remaining / self._active_workers
         eta_fmt = f"{int(eta_seconds // 60)}m {int(eta_seconds % 60)}s"
         
-        elapsed = time.time() - self.start_time
+        elapsed = time.monotonic() - self.start_time
         elapsed_fmt = f"{int(elapsed // 3600)}h {int((elapsed % 3600) // 60)}m {int(elapsed % 60)}s"
 
         self.logger.info(f"COMPLETED {key} for query {query_name}")
@@ -69,50 +123,68 @@ class SendQueryBot:
 
     def process_field_steps(self, page, query_name, key):
         """Executes the specific steps on the webpage for a single country."""
-        # Step 1: Navigation
-        s_nav = time.time()
-        if not navigate_to_trade_data(page, self.logger):
-            raise Exception("Navigation failed")
-        self.logger.info(f"Step [Navigation] took: {time.time() - s_nav:.2f}s")
-        
-        # Step 2: Query Selection
-        s_sel = time.time()
-        if not select_existing_query(page, query_name, self.logger):
-            raise Exception(f"Query selection failed for {query_name}")
-        self.logger.info(f"Step [Query Selection] took: {time.time() - s_sel:.2f}s")
+        on_query_screen = self._query_screen == query_name and return_to_reporter_step(page, self.logger)
+        self._query_screen = None
+        if on_query_screen:
+            self.logger.info("Still on the query-edit screen, skipping navigation and query selection.")
+        else:
+            # Step 1: Navigation
+            s_nav = time.monotonic()
+            if not self._retry("Navigation", lambda: navigate_to_trade_data(page, self.logger)):
+                raise Exception("Navigation failed")
+            self.logger.info(f"Step [Navigation] took: {time.monotonic() - s_nav:.2f}s")
+            
+            # Step 2: Query Selection (a failed attempt may have left the trade-data screen)
+            s_sel = time.monotonic()
+            if not self._retry(
+                "Query Selection", lambda: select_existing_query(page, query_name, self.logger),
+                before_retry=lambda: navigate_to_trade_data(page, self.logger)
+            ):
+                raise Exception(f"Query selection failed for {query_name}")
+            self.logger.info(f"Step [Query Selection] took: {time.monotonic() - s_sel:.2f}s")
         
-        # Step 3: Reporter Modification
-        s_mod = time.time()
-        if not handle_reporter_modification(page, query_name, self.logger, key):
+        # Step 3: Reporter Modification (retried on a freshly loaded query, never a half-modified form)
+        s_mod = time.monotonic()
+        if not self._retry(
+            "Reporter Modification", lambda: handle_reporter_modification(page, query_name, self.logger, key),
+            before_retry=lambda: self._reload_query(page, query_name)
+        ):
             raise Exception("Reporter modification failed")
-        self.logger.info(f"Step [Reporter Modification] took: {time.time() - s_mod:.2f}s")
+        self.logger.info(f"Step [Reporter Modification] took: {time.monotonic() - s_mod:.2f}s")
         
-        # Step 4: Final Submit
-        s_sub = time.time()
+        # Step 4: Final Submit. Not retried: the postback may have gone through before the error,
+        # and a second click would submit the query twice. The country is requeued instead.
+        s_sub = time.monotonic()
         if not click_final_submit(page, self.logger):
             raise Exception("Final submit failed")
-        self.logger.info(f"Step [Final Submit] took: {time.time() - s_sub:.2f}s")
+        self.logger.info(f"Step [Final Submit] took: {time.monotonic() - s_sub:.2f}s")
         
+        self._query_screen = query_name
         return True
 
+    def _retry(self, name, step, before_retry=None):
+        """Runs one page step with the configured number of in-place attempts."""
+        return retry_step(step, name, self.logger, attempts=self._step_attempts, before_retry=before_retry)
+
+    def _reload_query(self, page, query_name):
+        """Navigates back to the trade-data screen and reselects the query, discarding form edits."""
+        return navigate_to_trade_data(page, self.logger) and select_existing_query(page, query_name, self.logger)
+
     def process_country(self, page, query_name, key, country_name, current_idx, total_count):
         """Handles the lifecycle of processing a single country."""
         self.logger.info(f"\n{'='*60}")
         self.logger.info(f"[{query_name}] - STARTING [{current_idx}/{total_count}]: {country_name} ({key})")
         self.logger.info(f"{'-'*60}")
         
-        start_ts = time.time()
+        start_ts = time.monotonic()
         try:
             if self.process_field_steps(page, query_name, key):
-                self.log_country_progress(query_name, key, current_idx, total_count, time.time() - start_ts)
+                self.log_country_progress(query_name, key, current_idx, total_count, time.monotonic() - start_ts)
                 
                 # Success Marker: Write to output file
                 try:
-                    output_dir = os.path.join(os.getcwd(), 'output', 'done')
-                    os.makedirs(output_dir, exist_ok=True)
-                    output_file = os.path.join(output_dir, f"{query_name}")
-                    with open(output_file, 'a') as f:
-                        f.write(f"{key}\n")
+                    output_file = os.path.join(os.getcwd(), 'output', 'done', f"{query_name}")
+                    self._append_marker(output_file, key)
                     self.logger.info(f"Marked {key} as successfully finished in {output_file}")
                 except Exception as e:
                     self.logger.error(f"Failed to write success marker for {key}: {e}")
@@ -122,38 +194,148 @@ class SendQueryBot:
             self.logger.error(f"Error processing {key}: {e}")
             return False
 
-    def _run_iteration(self, query_name, undone_countries, iteration, total_count):
-        """Starts a browser session and processes as many countries as possible."""
+    def _append_marker(self, path, line):
+        """Appends a line to a marker file, keeping one line-buffered handle open per file."""
+        with self._marker_lock:
+            fp = self._marker_files.get(path)
+            if fp is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fp = self._marker_files[path] = open(path, 'a', buffering=1)
+            fp.write(f"{line}\n")
+
+    def close(self):
+        """Closes the marker file handles opened during the run."""
+        with self._marker_lock:
+            for fp in self._marker_files.values():
+                fp.close()
+            self._marker_files.clear()
+
+    def _run_iteration(self, query_name, undone_countries, remaining, iteration, total_count):
+        """
+        Opens a fresh browser context (the browser process itself is reused) and processes
+        as many countries as possible from the front of `remaining`.
+        """
         self.logger.info(f"--- Query: {query_name} | Iteration {iteration} | Remaining: {len(undone_countries)} ---")
-        page = self.browser_manager.start()
+        page = self.browser_manager.new_context(storage_state=self._session_state)
+        self._query_screen = None
         
         try:
             setup_auto_close_popup(page, self.logger)
             creds = self.config['credentials']
-            if not login(page, creds['email'], creds['password'], self.config['urls']['login'], self.logger):
+            login_url = self.config['urls']['login']
+            if self._session_state and is_logged_in(page, login_url, self.logger):
+                self.logger.info("Reusing saved session.")
+                self._session_state = page.context.storage_state()
+            elif login(page, creds['email'], creds['password'], login_url, self.logger):
+                self._session_state = self._save_session(page)
+            else:
+                self._session_state = None
                 self.logger.error("Login failed. Retrying...")
-                time.sleep(1)
                 return undone_countries
 
-            for key in list(undone_countries.keys()):
-                country_name = undone_countries[key]
-                current_idx = total_count - len(undone_countries) + 1
-                
-                if self.process_country(page, query_name, key, country_name, current_idx, total_count):
+            # Loop invariants bound once per iteration
+            process_country = self.process_country
+            checkpoint = self._checkpoint
+            first_idx = total_count - len(undone_countries) + 1
+            done = 0
+            while remaining:
+                key, country_name = remaining[0]
+                if process_country(page, query_name, key, country_name, first_idx + done, total_count):
+                    remaining.popleft()
                     del undone_countries[key]
-                    if not self.config.get('headless', False):
-                        page.wait_for_timeout(1000)
+                    checkpoint(query_name, undone_countries)
+                    done += 1
                 else:
-                    # Break inner loop to refresh browser/session on failure
+                    # Retry this country last, then break inner loop to refresh browser/session
+                    remaining.rotate(-1)
                     break
         
         except Exception as e:
             self.logger.exception(f"Unexpected error in {query_name} iteration {iteration}: {e}")
         finally:
-            self.browser_manager.stop()
+            # Drop the context only; the browser is reused by the next iteration
+            self.browser_manager.close_context()
             
         return undone_countries
 
+    def _run_parallel_iteration(self, query_name, undone_countries, remaining, iteration, total_count, workers):
+        """
+        Processes the undone countries with `workers` concurrent browser sessions popping from the shared `remaining` deque.
+        Each worker logs in on its own, so every session keeps its own server-side query state.
+        """
+        self.logger.info(
+            f"--- Query: {query_name} | Iteration {iteration} | Remaining: {len(undone_countries)} | Workers: {workers} ---"
+        )
+        self._active_workers = workers
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(self._run_country_worker, query_name, undone_countries, remaining, total_count)
+                    for _ in range(workers)
+                ]
+                for future in futures:
+                    future.result()
+        finally:
+            self._active_workers = 1
+        return undone_countries
+
+    def _run_country_worker(self, query_name, undone_countries, remaining, total_count):
+        """
+        Runs one worker session with its own browser on this thread; stops at the first failed country
+        so it is retried later. Logging, timing and markers are shared through this bot.
+        """
+        # Always launch a browser: an attached CDP browser's default context would share cookies between workers
+        browser_manager = BrowserManager(
+            headless=self.config.get('headless', False),
+            blocked_resource_types=self.browser_manager.blocked_resource_types,
+            blocked_hosts=self.browser_manager.blocked_hosts
+        )
+
+        try:
+            page = browser_manager.start()
+            setup_auto_close_popup(page, self.logger)
+            creds = self.config['credentials']
+            if not login(page, creds['email'], creds['password'], self.config['urls']['login'], self.logger):
+                self.logger.error("Worker login failed.")
+                return
+
+            while True:
+                # deque.popleft/append are atomic, so workers share `remaining` without a lock
+                try:
+                    key, country_name = remaining.popleft()
+                except IndexError:
+                    return
+                current_idx = total_count - len(undone_countries) + 1
+                if not self.process_country(page, query_name, key, country_name, current_idx, total_count):
+                    remaining.append((key, country_name))
+                    return
+                with self._undone_lock:
+                    del undone_countries[key]
+                    self._checkpoint(query_name, undone_countries)
+        except Exception as e:
+            self.logger.exception(f"Country worker for {query_name} failed: {e}")
+        finally:
+            browser_manager.stop()
+
+    @property
+    def _query_screen(self):
+        """Query whose edit screen this thread's page was left on by its last successful submit."""
+        return getattr(self._session_local, 'query_screen', None)
+
+    @_query_screen.setter
+    def _query_screen(self, query_name):
+        self._session_local.query_screen = query_name
+
+    def _save_session(self, page):
+        """Returns the logged-in storage_state, persisting it when a session file is configured."""
+        if not self._session_file:
+            return page.context.storage_state()
+        try:
+            return self.browser_manager.save_storage_state(self._session_file)
+        except OSError as e:
+            self.logger.warning(f"Could not save session to {self._session_file}: {e}")
+            return page.context.storage_state()
+
     def _check_progress(self, current_count, last_count, stagnant_iters):
         """Updates stagnation counters and returns (is_stagnant, new_last_count, new_stagnant_iters)."""
         if current_count == last_count:
@@ -165,29 +347,67 @@ class SendQueryBot:
         is_stagnant = stagnant_iters >= 5
         return is_stagnant, last_count, stagnant_iters
 
+    def _retry_delay(self, failed_iters):
+        """Exponential backoff with jitter before the next iteration, capped at retry_max_delay."""
+        automation = self.config.get('automation', {})
+        initial = automation.get('retry_initial_delay', 1)
+        growth = automation.get('retry_growth_factor', 2)
+        max_delay = automation.get('retry_max_delay', 30)
+        return min(max_delay, initial * growth ** failed_iters) * random.uniform(0.5, 1.5)
+
+    def _initial_countries(self, query_name):
+        """
+        Returns the countries (iso3 -> name) a query still has to submit: the checkpoint
+        of an interrupted run when there is one, otherwise every configured country.
+        """
+        path = self._checkpoint_path(query_name)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Ignoring unreadable checkpoint {path}: {e}")
+        return dict(self._all_iso3)
+
     def process_query(self, query_name):
         """Processes all countries for a specific query name using multiple iterations if needed."""
         # Setup file logging for this query
         log_path = os.path.join('logs', f"{query_name}.log")
-        self.logger = setup_logger(self.__class__.__name__, log_file=log_path)
+        attach_file_handler(self.logger, log_path)
         
         self.logger.info(f"\n{'#'*80}")
         self.logger.info(f"### PROCESSING QUERY: {query_name}")
         self.logger.info(f"### LOGGING TO: {log_path}")
         self.logger.info(f"{'#'*80}\n")
 
-        undone_countries = self.config['iso3_to_country'].copy()
+        undone_countries = self._initial_countries(query_name)
+        # Processing order; failed countries rotate to the back instead of blocking the next iteration
+        remaining = deque(undone_countries.items())
+        if len(undone_countries) < len(self._all_iso3):
+            self.logger.info(f"Resuming from checkpoint with {len(undone_countries)} undone countries.")
         total_count = len(undone_countries)
         last_undone_count = total_count
         stagnant_iters = 0
+        failed_iters = 0
         iteration = 1
-        self.processing_times = [] 
+        self.processing_times = deque(maxlen=ETA_WINDOW)
         index = 3
+        workers = int(self.config.get('automation', {}).get('country_workers', 1))
         while undone_countries:
             # if index%3 == 0:
             #     time.sleep(3)
             index += 1
-            undone_countries = self._run_iteration(query_name, undone_countries, iteration, total_count)
+            if not remaining:
+                # A worker died between taking a country and handing it back
+                remaining.extend(undone_countries.items())
+            if workers > 1 and len(undone_countries) > 1:
+                undone_countries = self._run_parallel_iteration(
+                    query_name, undone_countries, remaining, iteration, total_count, min(workers, len(undone_countries))
+                )
+            else:
+                undone_countries = self._run_iteration(query_name, undone_countries, remaining, iteration, total_count)
+            # Back off harder while iterations keep failing without progress
+            failed_iters = 0 if len(undone_countries) < last_undone_count else failed_iters + 1
             
             is_stagnant, last_undone_count, stagnant_iters = self._check_progress(
                 len(undone_countries), last_undone_count, stagnant_iters
@@ -196,29 +416,79 @@ class SendQueryBot:
             if is_stagnant:
                 self.logger.error(f"Stagnation detected for query {query_name}. Aborting this query.")
                 break
-                
+            
+            if undone_countries:
+                delay = self._retry_delay(failed_iters)
+                self.logger.info(f"Retrying in {delay:.1f}s...")
+                time.sleep(delay)
             iteration += 1
 
         if len(undone_countries) == 0:
             self.logger.info(f"All countries processed successfully for query {query_name}!")
+            self._clear_checkpoint(query_name)
         else:
             self.logger.warning(f"Query {query_name} finished with {len(undone_countries)} undone countries.")
             self.save_undone_countries(query_name, undone_countries)
         
         return len(undone_countries) == 0
 
+    def _run_parallel(self, query_names, workers):
+        """
+        Runs queries in separate processes, each with its own browser.
+        Largest queries are submitted first (LPT) so the pool does not end on one long straggler.
+        """
+        ordered = sorted(query_names, key=lambda q: len(self._initial_countries(q)), reverse=True)
+        workers = min(workers, len(ordered))
+        self.logger.info(f"Parallel run for queries with {workers} workers: {ordered}")
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_process_query_worker, self.config, q): q for q in ordered}
+            for future in as_completed(futures):
+                query_name = futures[future]
+                try:
+                    if not future.result():
+                        self.logger.warning(f"Query {query_name} did not complete fully.")
+                except Exception as e:
+                    self.logger.error(f"Worker for query {query_name} failed: {e}")
+
     def run(self):
-        self.start_time = time.time()
+        self.start_time = time.monotonic()
         self.logger.info("Starting SendQueryBot execution...")
         
         query_names = self.config['credentials'].get('query_name', [])
         if isinstance(query_names, str):
             query_names = [query_names]
         
-        self.logger.info(f"Sequential run for queries: {query_names}")
-        
-        for query_name in query_names:
-            if not self.process_query(query_name):
-                self.logger.warning(f"Query {query_name} did not complete fully.")
+        workers = int(self.config.get('automation', {}).get('query_workers', 1))
+        try:
+            if workers > 1 and len(query_names) > 1:
+                self._run_parallel(query_names, workers)
+            else:
+                self.logger.info(f"Sequential run for queries: {query_names}")
+                for query_name in query_names:
+                    if not self.process_query(query_name):
+                        self.logger.warning(f"Query {query_name} did not complete fully.")
+        finally:
+            self.browser_manager.stop()
+            self.close()
         
-        self.logger.info(f"Total time consumed: {time.time() - self.start_time:.2f} seconds.")
\ No newline at end of file
+        self.logger.info(f"Total time consumed: {time.monotonic() - self.start_time:.2f} seconds.")
+
+
+def _process_query_worker(config, query_name):
+    """Process-pool entry point: runs one query with its own bot and browser."""
+    # Spawned workers do not inherit the patch applied in main()
+    apply_playwright_patch(default=config.get('automation', {}).get('headless', False))
+    bot = SendQueryBot(config)
+    if bot._session_file:
+        # One session per query process: shared cookies would make them edit the same server-side query
+        bot._session_file = session_file_for(bot._session_file, query_name)
+        bot._session_state = load_storage_state(bot._session_file)
+    bot.start_time = time.monotonic()
+    try:
+        return bot.process_query(query_name)
+    finally:
+        bot.browser_manager.stop()
+        bot.close()
+        # Pool processes exit without running atexit hooks, so flush the log queue here
+        shutdown_logging()
@@ -1,13 +1,43 @@
 import yaml
 import os
+import pickle
+
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader as _Loader
 
 def load_config(config_path='config.yaml'):
-    """Loads the configuration from a YAML file."""
+    """
+    Loads the configuration from a YAML file.
+    The parsed result is cached in a `<config_path>.pkl` sidecar and reused while the YAML file is unchanged.
+    """
     if not os.path.exists(config_path):
         raise FileNotFoundError(f"Configuration file not found at {config_path}")
     
-    with open(config_path, 'r') as f:
-        return yaml.safe_load(f)
+    stat = os.stat(config_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cache_path = f"{config_path}.pkl"
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_signature, config = pickle.load(f)
+        if cached_signature == signature:
+            return config
+    except Exception:
+        # Missing, stale or corrupt cache (unpickling can raise nearly anything): reparse the YAML
+        pass
+    
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = yaml.load(f, Loader=_Loader)
+    
+    try:
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((signature, config), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+    return config
 
 def validate_config(config):
     """Validates that all required fields are present in the config."""
@@ -22,4 +52,19 @@ def validate_config(config):
     if 'urls' not in config or 'login' not in config['urls'] or 'advanced_query' not in config['urls']:
         raise ValueError("Missing required 'urls' section (login/advanced_query)")
     
+    automation = config.get('automation') or {}
+    for field in ['retry_initial_delay', 'retry_growth_factor', 'retry_max_delay']:
+        if field in automation:
+            value = automation[field]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                raise ValueError(f"automation.{field} must be a non-negative number")
+    if automation.get('retry_growth_factor', 2) < 1:
+        raise ValueError("automation.retry_growth_factor must be at least 1")
+    if automation.get('retry_max_delay', 30) < automation.get('retry_initial_delay', 1):
+        raise ValueError("automation.retry_max_delay must not be smaller than automation.retry_initial_delay")
+    
+    per_step = (config.get('retries') or {}).get('per_step')
+    if per_step is not None and (not isinstance(per_step, int) or per_step < 1):
+        raise ValueError("retries.per_step must be a positive integer")
+    
     return True
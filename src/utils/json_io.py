@@ -0,0 +1,21 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # Optional speedup; the stdlib fallback writes the same data
+    orjson = None
+
+def dumps(obj):
+    """Serializes `obj` to compact UTF-8 JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def write_json_atomic(path, obj):
+    """Writes `obj` to `path` with a single write to a temp file, then atomically replaces `path`."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(dumps(obj))
+    os.replace(tmp_path, path)
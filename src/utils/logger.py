@@ -1,34 +1,127 @@
+import atexit
 import logging
+import queue
 import sys
 import os
+import time
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%H:%M:%S'
+
+# File output is batched: INFO lines are written 256 at a time, WARNING and above flush immediately
+FILE_BUFFER_CAPACITY = 256
+FILE_MAX_BYTES = 10_000_000
+FILE_BACKUP_COUNT = 5
+
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter that renders the timestamp once per second instead of calling strftime for every record."""
+    def __init__(self, fmt=LOG_FORMAT, datefmt=DATE_FORMAT):
+        super().__init__(fmt, datefmt=datefmt)
+        self._cached_second = None
+        self._cached_time = ''
+
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        if second != self._cached_second:
+            self._cached_time = time.strftime(datefmt or self.datefmt, self.converter(second))
+            self._cached_second = second
+        return self._cached_time
+
+# Logger name -> (pid, QueueListener). The listener's background thread owns the real
+# stream/file handlers, so logging from the bot loop is only a queue.put.
+_listeners = {}
+
+def _get_listener(logger):
+    """Returns the logger's running listener, ignoring ones inherited from a parent process."""
+    entry = _listeners.get(logger.name)
+    if entry and entry[0] == os.getpid():
+        return entry[1]
+    return None
+
+def _set_handlers(listener, handlers):
+    """Swaps the listener's handlers, draining records queued for the old ones first."""
+    listener.stop()
+    listener.handlers = tuple(handlers)
+    listener.start()
+
+def _close_handler(handler):
+    """Closes a handler, flushing and closing the file behind a buffering MemoryHandler too."""
+    handler.close()
+    if isinstance(handler, MemoryHandler) and handler.target:
+        handler.target.close()
 
 def setup_logger(name='wits_automation', log_file=None):
     """Sets up a standardized logger with optional file output."""
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
-    
-    # Simple way to clear existing handlers if log_file is provided (re-initialization)
-    if log_file and logger.handlers:
-        logger.handlers = []
-
-    # Avoid duplicate handlers if not re-initializing
-    if not logger.handlers:
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%H:%M:%S')
-        
-        # Stream Handler
+    # Our handlers are the only output; never bubble up to root handlers added by basicConfig
+    logger.propagate = False
+
+    # Avoid duplicate handlers if the logger was already set up in this process
+    if _get_listener(logger) is None:
+        # Drop leftovers, e.g. a QueueHandler whose listener thread did not survive a fork
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            _close_handler(handler)
+
+        # Stream Handler (runs on the listener thread)
         stream_handler = logging.StreamHandler(sys.stdout)
-        stream_handler.setFormatter(formatter)
-        logger.addHandler(stream_handler)
-        
-        # File Handler
-        if log_file:
-            # Ensure folder exists
-            log_dir = os.path.dirname(log_file)
-            if log_dir and not os.path.exists(log_dir):
-                os.makedirs(log_dir)
-            
-            file_handler = logging.FileHandler(log_file, mode='a', encoding='utf-8')
-            file_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
-    
+        stream_handler.setFormatter(CachedTimeFormatter())
+
+        log_queue = queue.Queue(-1)
+        listener = QueueListener(log_queue, stream_handler)
+        listener.start()
+        logger.addHandler(QueueHandler(log_queue))
+        _listeners[name] = (os.getpid(), listener)
+
+    # File Handler
+    if log_file:
+        attach_file_handler(logger, log_file)
+
+    return logger
+
+def attach_file_handler(logger, log_file):
+    """Points the logger's file output at `log_file`, closing any file handler it already has."""
+    listener = _get_listener(logger)
+    if listener is None:
+        setup_logger(logger.name)
+        listener = _get_listener(logger)
+
+    # Already writing there: keep the open handler and its buffer
+    log_path = os.path.abspath(log_file)
+    for handler in listener.handlers:
+        if isinstance(handler, MemoryHandler) and getattr(handler.target, 'baseFilename', None) == log_path:
+            return logger
+
+    # Ensure folder exists
+    log_dir = os.path.dirname(log_file)
+    if log_dir and not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    file_handler = RotatingFileHandler(
+        log_file, mode='a', maxBytes=FILE_MAX_BYTES, backupCount=FILE_BACKUP_COUNT, encoding='utf-8'
+    )
+    file_handler.setFormatter(CachedTimeFormatter())
+    buffered = MemoryHandler(
+        FILE_BUFFER_CAPACITY, flushLevel=logging.WARNING, target=file_handler, flushOnClose=True
+    )
+
+    old_handlers = [h for h in listener.handlers if isinstance(h, (MemoryHandler, logging.FileHandler))]
+    _set_handlers(listener, [h for h in listener.handlers if h not in old_handlers] + [buffered])
+    for handler in old_handlers:
+        _close_handler(handler)
     return logger
+
+def shutdown_logging():
+    """Writes out all queued records and stops the listener threads of this process."""
+    pid = os.getpid()
+    for name, (owner, listener) in list(_listeners.items()):
+        if owner != pid:
+            continue
+        listener.stop()
+        for handler in listener.handlers:
+            _close_handler(handler)
+        del _listeners[name]
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,74 @@
+import os
+import sys
+import inspect
+import importlib
+import types
+
+# Playwright modules that capture the caller's stack on every API call. Older releases call
+# inspect.stack() in _connection and _sync_base; newer ones share _capture_stack_trace(),
+# which _sync_base, _disposable and _network import by name.
+_STACK_MODULES = ('_connection', '_sync_base', '_disposable', '_network')
+
+def _make_api_name_capture(internal_path, mapping_file):
+    """
+    Builds a _capture_stack_trace replacement that only derives the API name (e.g. "Page.click",
+    used in error messages and call metadata) from code objects. It skips f_locals and the
+    per-frame location list, which is where the original spends its time.
+    """
+    def capture():
+        frame = sys._getframe(2)
+        last_internal_api_name = ""
+        api_name = ""
+        while frame:
+            code = frame.f_code
+            filename = code.co_filename
+            if filename != mapping_file:
+                if filename.startswith(internal_path):
+                    last_internal_api_name = getattr(code, 'co_qualname', code.co_name)
+                elif last_internal_api_name:
+                    api_name = last_internal_api_name
+                    last_internal_api_name = ""
+            frame = frame.f_back
+        return {"frames": [], "apiName": api_name or last_internal_api_name, "title": None}
+    return capture
+
+def apply_playwright_patch(default=False):
+    """
+    Stops Playwright from capturing the caller's full stack on every API call (sync and async paths).
+    The stack only feeds trace locations, but costs a large share of CPU in tight loops.
+    PW_INSPECT_STACK=0 forces the patch on, PW_INSPECT_STACK=1 forces it off; otherwise `default` decides.
+    Returns True if the patch is active.
+    """
+    setting = os.environ.get('PW_INSPECT_STACK')
+    if setting is not None:
+        enabled = setting == '0'
+    else:
+        enabled = default
+    if not enabled:
+        return False
+
+    try:
+        from playwright._impl import _connection, _impl_to_api_mapping
+    except ImportError:
+        return False
+
+    # Swap only the `inspect` seen by Playwright's modules; the global module stays intact
+    shim = types.ModuleType('inspect')
+    shim.__dict__.update(inspect.__dict__)
+    shim.stack = lambda context=1: []
+
+    capture = None
+    if hasattr(_connection, '_capture_stack_trace'):
+        internal_path = getattr(_connection, '_PLAYWRIGHT_MODULE_PATH', os.path.dirname(os.path.dirname(_connection.__file__)))
+        capture = _make_api_name_capture(internal_path, _impl_to_api_mapping.__file__)
+
+    for name in _STACK_MODULES:
+        try:
+            module = importlib.import_module(f'playwright._impl.{name}')
+        except ImportError:
+            continue
+        if isinstance(getattr(module, 'inspect', None), types.ModuleType):
+            module.inspect = shim
+        if capture and hasattr(module, '_capture_stack_trace'):
+            module._capture_stack_trace = capture
+    return True
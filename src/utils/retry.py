@@ -0,0 +1,26 @@
+import time
+
+def retry_step(step, name, logger, attempts=2, backoff=0.5, before_retry=None):
+    """
+    Calls `step()` until it returns a truthy value, at most `attempts` times, sleeping
+    backoff * 2**n between tries. Recovers flaky clicks in place instead of restarting the session.
+    `before_retry()` runs ahead of every retry, to put the page back into a state the step can
+    safely start from again; the step is given up if it returns a falsy value.
+    Returns the step's last result; exceptions propagate only from the final attempt.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            result = step()
+            if result:
+                return result
+            logger.warning(f"Step [{name}] failed (attempt {attempt}/{attempts}).")
+        except Exception as e:
+            if attempt == attempts:
+                raise
+            logger.warning(f"Step [{name}] raised on attempt {attempt}/{attempts}: {e}")
+        if attempt < attempts:
+            time.sleep(backoff * 2 ** (attempt - 1))
+            if before_retry is not None and not before_retry():
+                logger.warning(f"Step [{name}] could not be reset for a retry.")
+                return result
+    return result